@@ -1,62 +1,397 @@
 import threading
+import timers
 import math
 import spi
 from stm.lis2hh12 import lis2hh12
+import ringstats
+import bands
+import impact
+import probe
 
-_lock = threading.Lock()
+_lock = probe.lock("accel")
 _accel = lis2hh12.LIS2HH12(SPI1, D60)
 
 _ACCEL_LP_COEF = 0.25
 _ACCEL_UPDATE = 10
-_x = 0.0
-_y = 0.0
-_z = 0.0
-_peak = 0.0
+_ACCEL_BURST = True  # read all axes in one SPI transaction
+_ACCEL_FIFO = True  # drain the hardware FIFO once per watermark
+_ACCEL_FIFO_WTM = 16  # samples per wakeup (FIFO holds 32)
+_ACCEL_INT_PIN = None  # pin wired to LIS2HH12 INT1 (None = sleep polling)
+_ACCEL_HISTORY = 512  # samples kept in the ring buffer
+_ACCEL_WINDOW = 500  # samples used for windowed statistics (5 s)
+_ACCEL_FIXED = True  # filter raw counts with integer math, scale in the getters
+# fixed-point pipeline
+_Q = 8  # fractional bits of the low-pass values
+_LP_SHIFT = 2  # low-pass coefficient 1/4 (same as _ACCEL_LP_COEF)
+_PEAK_SHIFT = 2  # peak deviation squared in units of 4 counts (fits 31-bit ints)
+_ACCEL_ORIENT_FILTER = False  # pitch/roll from a filter updated while sampling
+_ACCEL_ORIENT_COEF = 0.2  # weight of each new tilt measurement in the filter
+# vertical vibration RMS per frequency band (Hz), over blocks of samples
+# (fixed-point pipeline only; None disables)
+_ACCEL_BANDS = ((0.5, 2), (2, 5), (5, 10), (10, 20), (20, 50))
+_ACCEL_BLOCK = 128
+# impact and fall events (None disables), magnitudes in m/s^2 and times in ms
+_ACCEL_IMPACT = 17.7  # 1.8 g, just below the 2 g full scale
+_ACCEL_IMPACT_MS = 20
+_ACCEL_FREEFALL = 3.9  # 0.4 g
+_ACCEL_FREEFALL_MS = 80
+_ACCEL_FALL_WINDOW = 1000  # impact after a free fall within this time is a fall
+_ACCEL_EVENT_HOLDOFF = 2000
+_x = 0
+_y = 0
+_z = 0
+_peak = 0
+
+# orientation: samples processed so far, and the last (pitch, roll, seq)
+_seq = 0
+_orient = (0.0, 0.0, -1)
+
+_fifo_buf = [0] * (3 * lis2hh12.FIFO_DEPTH)
+_hist = ringstats.Window(_ACCEL_HISTORY, _ACCEL_WINDOW)
+
+_bands = None
+if _ACCEL_BANDS is not None and _ACCEL_FIXED:
+    _bands = bands.BandEnergy(_ACCEL_BLOCK, 1000 // _ACCEL_UPDATE, _ACCEL_BANDS)
+# pending impact/fall event for the main loop: (name, time, peak, seq)
+_alarm = None
+_alarm_flag = threading.Event()
+
+def _detector():
+    # thresholds in the unit of the samples given to the detector: counts
+    # (divided by 2^_PEAK_SHIFT to keep squares in 31-bit ints) or m/s^2
+    if _ACCEL_IMPACT is None:
+        return None
+    k = 1.0
+    if _ACCEL_FIXED:
+        k = _accel.scale() * (1 << _PEAK_SHIFT)
+    return impact.Detector(_ACCEL_IMPACT / k, _ACCEL_FREEFALL / k,
+                           _ACCEL_IMPACT_MS // _ACCEL_UPDATE, _ACCEL_FREEFALL_MS // _ACCEL_UPDATE,
+                           _ACCEL_FALL_WINDOW // _ACCEL_UPDATE, _ACCEL_EVENT_HOLDOFF // _ACCEL_UPDATE)
+
+_impact = _detector()
+
+# gravity direction (Q12 unit vector) used to project deviations on the vertical
+_gx = 0
+_gy = 0
+_gz = 1 << 12
+
+# interrupt-driven sampling
+_event = None
+_wakeups = 0
+_missed = 0
+_timeouts = 0
+_latency_last = 0
+_latency_max = 0
+_latency_sum = 0
+
+class IrqEvent:
+    """
+    Event source for the accel task. With a `pin` the event is signalled by
+    a rising edge on it, otherwise `signal()` must be called by whoever
+    simulates the interrupt line.
+    """
+    def __init__(self, pin=None):
+        self._evt = threading.Event()
+        # the edge count and the event change together: an edge between
+        # clearing the event and resetting the count is neither lost nor
+        # left behind as a wakeup without edges
+        self._lock = threading.Lock()
+        self.stamp = 0
+        self.pending = 0
+        if pin is not None:
+            onPinRise(pin, self.signal)
+
+    def signal(self):
+        self._lock.acquire()
+        self.stamp = timers.now()
+        self.pending += 1
+        self._evt.set()
+        self._lock.release()
+
+    def wait(self, timeout):
+        """
+        Wait up to `timeout` ms for the event. Returns the number of edges
+        seen since the previous call (0 on timeout).
+        """
+        self._evt.wait(timeout)
+        self._lock.acquire()
+        n = self.pending
+        self.pending = 0
+        self._evt.clear()
+        self._lock.release()
+        return n
+
+def _process(ax, ay, az):
+    global _x,_y,_z,_peak
+    _x = _ACCEL_LP_COEF * ax + (1-_ACCEL_LP_COEF) * _x
+    _y = _ACCEL_LP_COEF * ay + (1-_ACCEL_LP_COEF) * _y
+    _z = _ACCEL_LP_COEF * az + (1-_ACCEL_LP_COEF) * _z
+    #print("inc: ",_x,_y,_z,ax,ay,az)
+    # update peak diff
+    d_x = ax - _x
+    d_y = ay - _y
+    d_z = az - _z
+    d2 = d_x*d_x + d_y*d_y + d_z*d_z
+    if d2 > _peak:
+        _peak = d2
+    _hist.add(ax, ay, az, d_x, d_y, d_z)
+    if _impact is not None:
+        kind = _impact.add(ax, ay, az)
+        if kind:
+            _raise(kind)
+
+def _process_fixed(ax, ay, az):
+    # same as _process() on raw counts: low-pass values are kept in counts
+    # with _Q fractional bits, _peak and _hist hold counts
+    global _x,_y,_z,_peak
+    e_x = (ax << _Q) - _x
+    e_y = (ay << _Q) - _y
+    e_z = (az << _Q) - _z
+    _x += e_x >> _LP_SHIFT
+    _y += e_y >> _LP_SHIFT
+    _z += e_z >> _LP_SHIFT
+    # deviation from the updated low-pass value
+    d_x = e_x - (e_x >> _LP_SHIFT)
+    d_y = e_y - (e_y >> _LP_SHIFT)
+    d_z = e_z - (e_z >> _LP_SHIFT)
+    p_x = d_x >> (_Q + _PEAK_SHIFT)
+    p_y = d_y >> (_Q + _PEAK_SHIFT)
+    p_z = d_z >> (_Q + _PEAK_SHIFT)
+    d2 = p_x*p_x + p_y*p_y + p_z*p_z
+    if d2 > _peak:
+        _peak = d2
+    d_x >>= _Q
+    d_y >>= _Q
+    d_z >>= _Q
+    _hist.add(ax, ay, az, d_x, d_y, d_z)
+    if _bands is not None:
+        if _bands.add((d_x*_gx + d_y*_gy + d_z*_gz) >> 12):
+            _vertical()
+    if _impact is not None:
+        kind = _impact.add(ax >> _PEAK_SHIFT, ay >> _PEAK_SHIFT, az >> _PEAK_SHIFT)
+        if kind:
+            _raise(kind)
+
+def _raise(kind):
+    # new event for wait_event() (called with the lock held)
+    global _alarm
+    peak = math.sqrt(_impact.peak)
+    if _ACCEL_FIXED:
+        peak *= _accel.scale() * (1 << _PEAK_SHIFT)
+    _alarm = (impact.NAMES[kind], timers.now(), peak, _seq)
+    _alarm_flag.set()
+
+def _vertical():
+    # refresh the gravity direction from the low-pass value, once per block
+    global _gx, _gy, _gz
+    g = math.sqrt(float(_x)*_x + float(_y)*_y + float(_z)*_z)
+    if g > 0:
+        _gx = int(_x * 4096 / g)
+        _gy = int(_y * 4096 / g)
+        _gz = int(_z * 4096 / g)
+
+def _scale():
+    # factor from the values in _hist to the configured unit
+    if _ACCEL_FIXED:
+        return _accel.scale()
+    return 1.0
+
+_RAD2DEG = 57.29577951308232
+
+def _atan2(y, x):
+    # polynomial atan2 (error about 1e-5 rad), cheaper than math.atan2 on the VM
+    ax = abs(x)
+    ay = abs(y)
+    if ax == 0 and ay == 0:
+        return 0.0
+    if ax >= ay:
+        a = ay / ax
+    else:
+        a = ax / ay
+    s = a * a
+    r = ((((0.0208351 * s - 0.0851330) * s + 0.1801410) * s - 0.3302995) * s + 0.9998660) * a
+    if ay > ax:
+        r = 1.5707963267948966 - r
+    if x < 0:
+        r = 3.141592653589793 - r
+    if y < 0:
+        r = -r
+    return r
+
+def _estimate():
+    # complementary orientation filter: blend the tilt of the low-pass
+    # vector into the estimate (roll wraps around at +/-180 degrees)
+    global _orient
+    x = float(_x)
+    y = float(_y)
+    z = float(_z)
+    pitch = _atan2(-x, math.sqrt(y*y + z*z)) * _RAD2DEG
+    roll = _atan2(y, z) * _RAD2DEG
+    o = _orient
+    if o[2] >= 0:
+        pitch = o[0] + _ACCEL_ORIENT_COEF * (pitch - o[0])
+        d = roll - o[1]
+        if d > 180:
+            d -= 360
+        elif d < -180:
+            d += 360
+        roll = o[1] + _ACCEL_ORIENT_COEF * d
+        if roll > 180:
+            roll -= 360
+        elif roll <= -180:
+            roll += 360
+    _orient = (pitch, roll, _seq)
 
 def _update():
+    global _seq
+    _lock.acquire()
+    try:
+        if _ACCEL_FIXED:
+            a = _accel.acceleration_raw()
+            _process_fixed(a[0], a[1], a[2])
+        else:
+            a = _accel.acceleration(_ACCEL_BURST)
+            _process(a[0], a[1], a[2])
+        _seq += 1
+        if _ACCEL_ORIENT_FILTER:
+            _estimate()
+    finally:
+        _lock.release()
+
+def _update_fifo():
+    global _seq
+    buf = _fifo_buf
     _lock.acquire()
     try:
-        global _x,_y,_z,_peak
-        a = _accel.acceleration()
-        _x = _ACCEL_LP_COEF * a[0] + (1-_ACCEL_LP_COEF) * _x
-        _y = _ACCEL_LP_COEF * a[1] + (1-_ACCEL_LP_COEF) * _y
-        _z = _ACCEL_LP_COEF * a[2] + (1-_ACCEL_LP_COEF) * _z
-        #print("inc: ",_x,_y,_z,a,len(accel))
-        # update peak diff
-        d_x = a[0] - _x
-        d_y = a[1] - _y
-        d_z = a[2] - _z
-        d2 = d_x*d_x + d_y*d_y + d_z*d_z
-        if d2 > _peak:
-            _peak = d2
+        n = _accel.read_fifo(buf)
+        if _ACCEL_FIXED:
+            for i in range(0, 3*n, 3):
+                _process_fixed(buf[i], buf[i+1], buf[i+2])
+        else:
+            k = _accel.scale()
+            for i in range(0, 3*n, 3):
+                _process(buf[i] * k, buf[i+1] * k, buf[i+2] * k)
+        if n > 0:
+            _seq += n
+            if _ACCEL_ORIENT_FILTER:
+                _estimate()
     finally:
         _lock.release()
+    return n
+
+def _period():
+    if _ACCEL_FIFO:
+        return _ACCEL_UPDATE * _ACCEL_FIFO_WTM
+    return _ACCEL_UPDATE
+
+def _track(edges, overruns):
+    global _wakeups, _missed, _timeouts, _latency_last, _latency_max, _latency_sum
+    _wakeups += 1
+    if edges == 0:
+        _timeouts += 1
+        return
+    if _ACCEL_FIFO:
+        _missed += _accel.fifo_overruns - overruns
+    else:
+        _missed += edges - 1
+    _latency_last = timers.now() - _event.stamp
+    _latency_sum += _latency_last
+    if _latency_last > _latency_max:
+        _latency_max = _latency_last
+
+def set_event_source(source):
+    """
+    Make the accel task block on `source` instead of sleeping. `source`
+    needs a `wait(timeout)` method returning the number of ready edges and
+    a `stamp` attribute with the time of the last edge (see `IrqEvent`).
+    Must be called before `start()`.
+    """
+    global _event
+    _event = source
+
+def get_irq_stats():
+    """
+    Returns (wakeups, missed, timeouts, last latency, max latency, average
+    latency) of the interrupt-driven path, latencies in ms. Missed counts
+    lost data-ready edges, or FIFO overruns in FIFO mode.
+    """
+    _lock.acquire()
+    n = _wakeups - _timeouts
+    avg = 0
+    if n > 0:
+        avg = _latency_sum / n
+    ret = (_wakeups, _missed, _timeouts, _latency_last, _latency_max, avg)
+    _lock.release()
+    return ret
 
 def _run(arg):
+    global _peak
     # discard initial samples (accel filters need time to stabilize)
     _lock.acquire()
     try:
         for n in range(15):
             sleep(10)
             _accel.acceleration()
-        _peak = 0.0
+        _peak = 0
+        if _ACCEL_FIFO:
+            _accel.fifo(lis2hh12.FIFO_STREAM, _ACCEL_FIFO_WTM)
+        if _event is not None:
+            _accel.int1(drdy=not _ACCEL_FIFO, fth=_ACCEL_FIFO)
     finally:
         _lock.release()
     # refresh
+    loop = probe.loop("accel", _period())
     while True:
+        loop.tick()
+        if _event is not None:
+            # time out after a few periods, in case an edge is lost
+            edges = _event.wait(4 * _period())
+            overruns = _accel.fifo_overruns
         try:
-            _update()
+            if _ACCEL_FIFO:
+                _update_fifo()
+            else:
+                _update()
+            if _bands is not None and _bands.pending:
+                # block transform outside the lock, getters only read `features`
+                _bands.compute()
+            if _event is not None:
+                _lock.acquire()
+                _track(edges, overruns)
+                _lock.release()
         except Exception as e:
             print("Accel task:",e)
-        sleep(_ACCEL_UPDATE)
+        if _event is None:
+            sleep(_period())
 
-def get_pitchroll():
+def get_orientation():
+    """
+    Returns (pitch, roll, seq): angles in degrees and the number of samples
+    they account for. Callers can skip their own work while seq does not
+    change. Angles are computed at most once per new sample, or kept up to
+    date by the sampling task when _ACCEL_ORIENT_FILTER is set.
+    """
+    global _orient
     _lock.acquire()
-    tmp = math.sqrt(_y*_y + _z*_z);
-    pitch = math.degrees(math.atan2(-_x, tmp))
-    roll = math.degrees(math.atan2(_y, _z))
+    o = _orient
+    if _ACCEL_ORIENT_FILTER or o[2] == _seq:
+        _lock.release()
+        return o
+    x = float(_x)
+    y = float(_y)
+    z = float(_z)
+    seq = _seq
     _lock.release()
-    return (pitch, roll)
+    tmp = math.sqrt(y*y + z*z)
+    pitch = math.degrees(math.atan2(-x, tmp))
+    roll = math.degrees(math.atan2(y, z))
+    o = (pitch, roll, seq)
+    _orient = o
+    return o
+
+def get_pitchroll():
+    o = get_orientation()
+    return (o[0], o[1])
 
 def get_temperature():
     _lock.acquire()
@@ -64,12 +399,97 @@ def get_temperature():
     _lock.release()
     return t
 
+def set_window(samples):
+    """
+    Set the number of samples used by get_stats()/get_vibration() (at most
+    _ACCEL_HISTORY). Statistics restart from empty.
+    """
+    _lock.acquire()
+    _hist.set_window(samples)
+    _lock.release()
+
+def get_stats():
+    """
+    Windowed statistics per axis, as a 3-tuple (X, Y, Z) of
+    (mean, rms, peak, zero-crossing rate in Hz). Mean, rms (deviation
+    around the mean) and peak (deviation from the low-pass value) are in
+    m/s^2.
+    """
+    _lock.acquire()
+    try:
+        ret = (_axis_stats(0), _axis_stats(1), _axis_stats(2))
+    finally:
+        _lock.release()
+    return ret
+
+def _axis_stats(a):
+    k = _scale()
+    return (_hist.mean(a) * k, _hist.rms(a) * k, _hist.peak(a) * k, _hist.zcr(a) * 1000 / _ACCEL_UPDATE)
+
+def get_vibration():
+    """
+    Vibration magnitude over the window, as (rms, peak) in m/s^2.
+    """
+    _lock.acquire()
+    v = _hist.variance(0) + _hist.variance(1) + _hist.variance(2)
+    px = _hist.peak(0)
+    py = _hist.peak(1)
+    pz = _hist.peak(2)
+    _lock.release()
+    k = _scale()
+    return (math.sqrt(v) * k, math.sqrt(px*px + py*py + pz*pz) * k)
+
+def get_bands():
+    """
+    Vertical vibration RMS in each band of _ACCEL_BANDS over the last block
+    of _ACCEL_BLOCK samples, as a tuple in m/s^2 (None until the first
+    block, or when band analysis is off).
+    """
+    if _bands is None:
+        return None
+    f = _bands.features
+    if f is None:
+        return None
+    k = _accel.scale()
+    res = []
+    for v in f:
+        res.append(v * k)
+    return tuple(res)
+
+def wait_event(timeout):
+    """
+    Wait up to `timeout` ms for an impact or fall. Returns the event as
+    (name, detection time in ms, peak in m/s^2, sample seq), or None.
+    Only the latest event is kept if several happen between calls.
+    """
+    global _alarm
+    _alarm_flag.wait(timeout)
+    _lock.acquire()
+    ev = _alarm
+    _alarm = None
+    _alarm_flag.clear()
+    _lock.release()
+    return ev
+
+def get_event_stats():
+    """
+    Returns (impacts, falls) detected so far.
+    """
+    if _impact is None:
+        return (0, 0)
+    return (_impact.impacts, _impact.falls)
+
 def get_sigma():
+    global _peak
     _lock.acquire()
     sigma = math.sqrt(_peak)
-    _peak = 0.0
+    _peak = 0
     _lock.release()
+    if _ACCEL_FIXED:
+        sigma *= _accel.scale() * (1 << _PEAK_SHIFT)
     return sigma
     
 def start():
+    if _event is None and _ACCEL_INT_PIN is not None:
+        set_event_source(IrqEvent(_ACCEL_INT_PIN))
     thread(_run,"Accel Task")
@@ -1,10 +1,10 @@
-import threading
 import timers
 import math
 from fortebit.polaris import polaris
 import i2c
 from bosch.bme680 import bme680
 from mikroe import airquality5
+import probe
 
 GAS_CO = 1
 GAS_NO2 = 2
@@ -17,6 +17,11 @@ GAS_C2H5OH = 8
 GAS_VOC = 9
 
 _AIR_UPDATE = 800
+_AIR_ALERT_PIN = None  # pin wired to the ADS1015 ALERT/RDY output
+# watch mode: sleep until a gas channel leaves its band
+_AIR_WATCH_INDEX = 1  # channel watched by the comparator (0=NH3, 1=CO, 2=NO2)
+_AIR_WATCH_BAND = 0.1  # allowed relative change before waking up
+_AIR_WATCH_MAX = 60000  # refresh anyway after this long (ms)
 
 # RES0 values derived from https://github.com/Seeed-Studio/Mutichannel_Gas_Sensor
 # (they use a 56k pull-up on 10-bit ADC channels)
@@ -24,11 +29,11 @@ _RES0_NO2 = 56.0e3/(1024-155)*155
 _RES0_NH3 = 56.0e3/(1024-860)*860
 _RES0_CO = 56.0e3/(1024-950)*950
 
-_lock = threading.Lock()
+_lock = probe.lock("air")
 _air5 = None
 _bme680 = None
 try:
-    _air5 = airquality5.AirQuality5(I2C0)
+    _air5 = airquality5.AirQuality5(I2C0, rdy_pin=_AIR_ALERT_PIN)
 except Exception as e:
     _air5 = None
     print("Air Quality 5 click not found",e)
@@ -38,80 +43,156 @@ except Exception as e:
     _bme680 = None
     print("Environment click not found",e)
 
-_ratio0 = 0
-_ratio1 = 0
-_ratio2 = 0
-_voc = 0
-_temp = 0
-_hum = 0
-_press = 0
+# Latest readings, built by the reader thread off-lock and replaced as a
+# whole, so getters never wait for a measurement in progress:
+# (ratio0, ratio1, ratio2, voc, temp, hum, press)
+_snap = (0, 0, 0, 0, 0, 0, 0)
 _since = 0
 _lowpower = True
+_watch = False
+_watch_wakeups = 0
+_watch_alarms = 0
 
 #print("RES0=",(_RES0_NO2,_RES0_NH3,_RES0_CO))
 
-def _update():
-    global _ratio0, _ratio1, _ratio2, _voc, _temp, _hum, _press
+class _Interval:
+    # running min/max/sum of each snapshot value, in constant memory
+    def __init__(self, n):
+        self.n = n
+        self.min = [0.0] * n
+        self.max = [0.0] * n
+        self.sum = [0.0] * n
+        self.count = 0
+
+    def add(self, v):
+        if self.count == 0:
+            for i in range(self.n):
+                self.min[i] = v[i]
+                self.max[i] = v[i]
+                self.sum[i] = v[i]
+        else:
+            for i in range(self.n):
+                x = v[i]
+                if x < self.min[i]:
+                    self.min[i] = x
+                if x > self.max[i]:
+                    self.max[i] = x
+                self.sum[i] += x
+        self.count += 1
+
+# names and scale factors (ratio to resistance for the gas sensors) of the
+# values summarized by get_interval(), in snapshot order
+INTERVAL_NAMES = ("NH3", "CO", "NO2", "VOC", "temperature", "humidity", "pressure")
+_INTERVAL_SCALE = (_RES0_NH3, _RES0_CO, _RES0_NO2, 1, 1, 1, 1)
+
+# every reading goes into _interval (under _lock); get_interval() swaps in
+# the spare one, so the task never waits for the summary to be computed
+_interval = _Interval(len(INTERVAL_NAMES))
+_interval_spare = _Interval(len(INTERVAL_NAMES))
+
+def _update(snap):
+    ratio0, ratio1, ratio2, voc, temp, hum, press = snap
     if _air5 is not None:
         v = _air5.measure()
         #print("v=",v)
-        _ratio0 = v[0] / _RES0_NH3
-        _ratio1 = v[1] / _RES0_CO
-        _ratio2 = v[2] / _RES0_NO2
+        ratio0 = v[0] / _RES0_NH3
+        ratio1 = v[1] / _RES0_CO
+        ratio2 = v[2] / _RES0_NO2
     if _bme680 is not None:
-        _voc = _bme680.gas()
-        _temp = _bme680.temperature()
-        _hum = _bme680.humidity()
-        _press = _bme680.pressure()
+        temp, hum, press, voc = _bme680.read_all()
+    return (ratio0, ratio1, ratio2, voc, temp, hum, press)
 
 def get_temp_hum_press():
     c = None
     if _bme680 is not None:
-        _lock.acquire()
-        c = (_temp, _hum, _press)
-        _lock.release()
+        s = _snap
+        c = (s[4], s[5], s[6])
     return c
 
 def get_resistance(gas):
-    _lock.acquire()
+    s = _snap
     if gas == GAS_CO:
-        c = _ratio1 * _RES0_CO
+        c = s[1] * _RES0_CO
     elif gas == GAS_NO2:
-        c = _ratio2 * _RES0_NO2
+        c = s[2] * _RES0_NO2
     elif gas == GAS_NH3:
-        c = _ratio0 * _RES0_NH3
+        c = s[0] * _RES0_NH3
     elif gas == GAS_VOC:
-        c = _voc
+        c = s[3]
     else:
         c = None
-    _lock.release()
     return c
 
+# Seeed curves as ppm = A * ratio^B, in the log domain: for each gas from
+# GAS_CO to GAS_C2H5OH, (index of the ratio in the snapshot, ln A, B)
+_CURVES = (
+    (1, math.log(4.385), -1.179),  # CO
+    (2, -math.log(6.855), 1.007),  # NO2
+    (0, -math.log(1.4), -1.67),  # NH3
+    (0, math.log(570.164), -2.518),  # C3H8
+    (0, math.log(398.107), -2.138),  # C4H10
+    (1, math.log(630.957), -4.363),  # CH4
+    (1, math.log(0.73), -1.8),  # H2
+    (1, math.log(1.622), -1.552),  # C2H5OH
+)
+# names of the gases in the get_all_ppm() result
+PPM_NAMES = ("CO", "NO2", "NH3", "C3H8", "C4H10", "CH4", "H2", "C2H5OH")
+# (snapshot, concentrations) of the last get_all_ppm()
+_ppm = (None, None)
+
+def get_all_ppm():
+    """
+    Concentrations in ppm of every gas from GAS_CO to GAS_C2H5OH (index
+    gas - GAS_CO), all from the same readings, or None if not available.
+    Same values as get_ppm() within float rounding: three logarithms and
+    one exp per gas, computed once per new reading.
+    """
+    global _ppm
+    s = _snap
+    c = _ppm
+    if c[0] is s:
+        return c[1]
+    res = None
+    if _air5 is not None and s[0] > 0 and s[1] > 0 and s[2] > 0:
+        lr = (math.log(s[0]), math.log(s[1]), math.log(s[2]))
+        res = []
+        for curve in _CURVES:
+            res.append(math.exp(curve[1] + curve[2] * lr[curve[0]]))
+        res = tuple(res)
+    _ppm = (s, res)
+    return res
+
 def get_ppm(gas):
     # derived from https://github.com/Seeed-Studio/Mutichannel_Gas_Sensor
-    _lock.acquire()
+    s = _snap
+    r0 = s[0]
+    r1 = s[1]
+    r2 = s[2]
     if gas == GAS_CO:
-        c = math.pow(_ratio1, -1.179) * 4.385
+        c = math.pow(r1, -1.179) * 4.385
     elif gas == GAS_NO2:
-        c = math.pow(_ratio2, 1.007) / 6.855
+        c = math.pow(r2, 1.007) / 6.855
     elif gas == GAS_NH3:
-        c = math.pow(_ratio0, -1.67) / 1.4
+        c = math.pow(r0, -1.67) / 1.4
     elif gas == GAS_C3H8:
-        c = math.pow(_ratio0, -2.518) * 570.164
+        c = math.pow(r0, -2.518) * 570.164
     elif gas == GAS_C4H10:
-        c = math.pow(_ratio0, -2.138) * 398.107
+        c = math.pow(r0, -2.138) * 398.107
     elif gas == GAS_CH4:
-        c = math.pow(_ratio1, -4.363) * 630.957
+        c = math.pow(r1, -4.363) * 630.957
     elif gas == GAS_H2:
-        c = math.pow(_ratio1, -1.8) * 0.73
+        c = math.pow(r1, -1.8) * 0.73
     elif gas == GAS_C2H5OH:
-        c = math.pow(_ratio1, -1.552) * 1.622
+        c = math.pow(r1, -1.552) * 1.622
     else:
         c = None
-    _lock.release()
     return c
 
 def start():
+    global _since
+    if _air5 is not None and _AIR_ALERT_PIN is not None:
+        # the pin may be set after import, as long as it is before start()
+        _air5.ads.enable_ready(_AIR_ALERT_PIN)
     thread(_run,"AirQuality Task")
     _since = timers.now()
 
@@ -133,6 +214,58 @@ def set_lowpower(mode):
     _lock.release()
 
 
+def set_watch(mode):
+    """
+    Enable or disable watch mode: after each refresh the task sleeps until
+    the watched gas channel leaves its band (ADC window comparator), or for
+    at most _AIR_WATCH_MAX ms, instead of polling every _AIR_UPDATE ms.
+    """
+    global _watch
+    _lock.acquire()
+    _watch = mode
+    _lock.release()
+
+def get_watch_stats():
+    """
+    Returns (wakeups, alarms) of watch mode: alarms are the wakeups caused
+    by a gas channel leaving its band, the others are timeouts.
+    """
+    return (_watch_wakeups, _watch_alarms)
+
+def _watch_once():
+    global _watch_wakeups, _watch_alarms
+    _air5.arm(_AIR_WATCH_INDEX, _AIR_WATCH_BAND)
+    try:
+        alarm = _air5.wait_alarm(_AIR_WATCH_MAX)
+    finally:
+        _air5.disarm()
+    _watch_wakeups += 1
+    if alarm:
+        _watch_alarms += 1
+
+def get_interval():
+    """
+    Summary of the readings since the previous call, and restart: returns
+    (count, stats) with stats a tuple of (min, max, mean) for each value in
+    INTERVAL_NAMES (gas sensors as resistances in ohm), or None if there
+    were no readings. Meant for a single reader (the publishing loop).
+    """
+    global _interval, _interval_spare
+    _lock.acquire()
+    iv = _interval
+    _interval = _interval_spare
+    _interval_spare = iv
+    _lock.release()
+    n = iv.count
+    if n == 0:
+        return None
+    stats = []
+    for i in range(iv.n):
+        k = _INTERVAL_SCALE[i]
+        stats.append((iv.min[i] * k, iv.max[i] * k, iv.sum[i] * k / n))
+    iv.count = 0
+    return (n, tuple(stats))
+
 def is_warmed_up():
     _lock.acquire()
     if timers.now() - _since > 60000 and not _lowpower:
@@ -143,17 +276,28 @@ def is_warmed_up():
     return ret
 
 def _run(arg):
+    global _snap, _since
     # refresh
+    loop = probe.loop("air", _AIR_UPDATE)
     while True:
-        _lock.acquire()
+        loop.tick()
+        delay = _AIR_UPDATE
         try:
             if not _lowpower:
-                _update()
+                # measure without holding the lock, then publish atomically
+                _snap = _update(_snap)
+                _lock.acquire()
+                _interval.add(_snap)
+                _lock.release()
+                if _watch and _air5 is not None:
+                    _watch_once()
+                    delay = 0
             else:
+                _lock.acquire()
                 _since = timers.now()
+                _lock.release()
         except Exception as e:
             print("Air Exc:", e)
-        finally:
-            _lock.release()
-        sleep(_AIR_UPDATE)
+        if delay > 0:
+            sleep(delay)
 
@@ -0,0 +1,158 @@
+# Vibration energy per frequency band, from blocks of integer samples.
+#
+# Samples are collected in blocks of `size` (a power of two) while sampling,
+# and each complete block is Hann-windowed and transformed with an in-place
+# radix-2 FFT in fixed point outside the sampling path. Every product fits
+# in 31-bit integers: the block is normalized to 14 bits (block floating
+# point), twiddles and window are Q12, and each FFT stage halves the values.
+# The result is the RMS of the signal in each band, in input units.
+
+import math
+
+_TW = 12  # fractional bits of twiddle factors and window
+_NORM = 8192  # blocks are shifted up until their peak reaches this value
+# mean square of the Hann window (energy lost by windowing)
+_HANN_POWER = 0.375
+
+class BandEnergy:
+    """
+    Band RMS of a signal sampled at `rate` Hz, over blocks of `size`
+    samples. `bands` is a sequence of (low, high) frequency ranges in Hz,
+    each including the FFT bins with low <= f < high.
+
+    add() is cheap and meant for the sampling loop: it returns True when a
+    block is complete, then compute() (possibly in another context) turns
+    it into `features`. One block is buffered while the next is collected.
+    """
+    def __init__(self, size=128, rate=100, bands=((0.5, 2), (2, 5), (5, 10), (10, 20), (20, 50))):
+        bits = 0
+        while (1 << bits) < size:
+            bits += 1
+        if (1 << bits) != size:
+            raise ValueError("size must be a power of two")
+        self.size = size
+        self.rate = rate
+        self._bufs = ([0] * size, [0] * size)
+        self._fill = 0
+        self._pos = 0
+        self.pending = False
+        self._re = [0] * size
+        self._im = [0] * size
+        self._rev = [0] * size
+        for i in range(size):
+            r = 0
+            for b in range(bits):
+                if i & (1 << b):
+                    r |= 1 << (bits - 1 - b)
+            self._rev[i] = r
+        one = 1 << _TW
+        self._cos = [0] * (size // 2)
+        self._sin = [0] * (size // 2)
+        for k in range(size // 2):
+            a = 2 * math.pi * k / size
+            self._cos[k] = int(round(math.cos(a) * one))
+            self._sin[k] = int(round(-math.sin(a) * one))
+        self._win = [0] * size
+        for i in range(size):
+            self._win[i] = int(round((0.5 - 0.5 * math.cos(2 * math.pi * i / size)) * one))
+        self.set_bands(bands)
+        self.features = None
+        self.blocks = 0
+        self.dropped = 0
+
+    def set_bands(self, bands):
+        """ Change the frequency bands (takes effect from the next block). """
+        res = self.rate / self.size
+        bins = []
+        for b in bands:
+            k0 = int(math.ceil(b[0] / res))
+            k1 = int(math.ceil(b[1] / res))
+            if k0 < 1:
+                k0 = 1
+            if k1 > self.size // 2:
+                k1 = self.size // 2
+            if k1 < k0:
+                k1 = k0
+            bins.append((k0, k1))
+        self._bins = tuple(bins)
+
+    def add(self, v):
+        """ Append one sample (an int). Returns True when a block is complete. """
+        self._bufs[self._fill][self._pos] = v
+        self._pos += 1
+        if self._pos < self.size:
+            return False
+        self._pos = 0
+        if self.pending:
+            # the previous block was not computed yet: drop this one
+            self.dropped += 1
+        else:
+            self._fill ^= 1
+            self.pending = True
+        return True
+
+    def compute(self):
+        """
+        Process the complete block, if any, and return `features`: a tuple
+        with the RMS in each band (None before the first block).
+        """
+        if not self.pending:
+            return self.features
+        n = self.size
+        buf = self._bufs[self._fill ^ 1]
+        re = self._re
+        im = self._im
+        win = self._win
+        rev = self._rev
+
+        # windowed input in bit-reversed order, normalized to 14 bits
+        peak = 0
+        for i in range(n):
+            v = (buf[i] * win[i]) >> _TW
+            re[rev[i]] = v
+            if v < 0:
+                v = -v
+            if v > peak:
+                peak = v
+        self.pending = False
+        shift = 0
+        if peak > 0:
+            while peak < _NORM:
+                peak <<= 1
+                shift += 1
+        for i in range(n):
+            re[i] <<= shift
+            im[i] = 0
+
+        # radix-2 butterflies, values halved at every stage
+        cos = self._cos
+        sin = self._sin
+        half = 1
+        step = n >> 1
+        while half < n:
+            span = half << 1
+            for k in range(half):
+                wr = cos[k * step]
+                wi = sin[k * step]
+                for i in range(k, n, span):
+                    j = i + half
+                    tr = (re[j] * wr - im[j] * wi) >> _TW
+                    ti = (re[j] * wi + im[j] * wr) >> _TW
+                    re[j] = (re[i] - tr) >> 1
+                    im[j] = (im[i] - ti) >> 1
+                    re[i] = (re[i] + tr) >> 1
+                    im[i] = (im[i] + ti) >> 1
+            half = span
+            step >>= 1
+
+        # one-sided spectrum of X/n: band mean square is 2 * sum |X/n|^2
+        k = 2.0 / _HANN_POWER / (1 << (2 * shift))
+        out = []
+        for b in self._bins:
+            e = 0.0
+            for i in range(b[0], b[1]):
+                e += re[i] * re[i] + im[i] * im[i]
+            out.append(math.sqrt(e * k))
+        self.features = tuple(out)
+        self.blocks += 1
+        return self.features
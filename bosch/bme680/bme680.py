@@ -64,6 +64,15 @@ _BME680_FILTERSIZES = (0, 1, 3, 7, 15, 31, 63, 127)
 
 _BME680_RUNGAS = 0x10
 
+# measurement duration model (from the Bosch BME68x API), in microseconds
+_BME680_MEAS_CYCLE_US = 1963
+_BME680_TPH_SWITCH_US = 477 * 4
+_BME680_GAS_MEAS_US = 477 * 5
+_BME680_WAKEUP_US = 1000
+# fallback polling when data is not ready after the predicted time
+_BME680_POLL_MS = 2
+_BME680_POLL_MAX = 20
+
 _LOOKUP_TABLE_1 = (2147483647.0, 2147483647.0, 2147483647.0, 2147483647.0, 2147483647.0,
                    2126008810.0, 2147483647.0, 2130303777.0, 2147483647.0, 2147483647.0,
                    2143188679.0, 2136746228.0, 2147483647.0, 2126008810.0, 2147483647.0,
@@ -98,8 +107,14 @@ class BME680(i2c.I2C):
         self._debug = debug
         """Check the BME680 was found, read the coefficients and enable the sensor for continuous
            reads."""
+        self.transactions = 0
+        """Number of I2C transactions issued so far."""
+        self.last_transactions = 0
+        """Number of I2C transactions used by the last measurement."""
         self._write(_BME680_REG_SOFTRESET, [0xB6])
         sleep(5)
+        # shadow copy of the configuration registers written since reset
+        self._shadow = {}
 
         # Check device ID.
         chip_id = self._read_byte(_BME680_REG_CHIPID)
@@ -110,6 +125,19 @@ class BME680(i2c.I2C):
 
         # set up heater
         self.ambient_temperature = 25
+        self.heater_temperature = 300
+        """Target heater temperature in degrees celsius."""
+        self.heater_duration = 150
+        """Heater on time in milliseconds."""
+        self._heat_key = None
+        self.predicted_wait = 0
+        """Predicted duration of the last measurement, in milliseconds."""
+        self.actual_wait = 0
+        """Time from trigger to data ready of the last measurement, in milliseconds."""
+        self.extra_polls = 0
+        """Status reads needed after the predicted time in the last measurement."""
+        self._res_heat = 0
+        self._res_wait = 0
         #self._write(_BME680_BME680_RES_WAIT_0, [0x73, 0x64, 0x65])
         self.sea_level_pressure = 1013.25
         """Pressure in hectoPascals at sea level. Used to calibrate ``altitude``."""
@@ -174,7 +202,7 @@ class BME680(i2c.I2C):
     @filter_size.setter
     def filter_size(self, size):
         if size in _BME680_FILTERSIZES:
-            self._filter = _BME680_FILTERSIZES[size]
+            self._filter = _BME680_FILTERSIZES.index(size)
         else:
             raise new_exception(BME680_Exception, RuntimeError, "Invalid size")
 
@@ -182,13 +210,35 @@ class BME680(i2c.I2C):
     def temperature(self):
         """The compensated temperature in degrees celsius."""
         self._perform_reading()
-        calc_temp = (((self._t_fine * 5) + 128) / 256)
-        return calc_temp / 100
+        return self._calc_temperature()
 
     @property
     def pressure(self):
         """The barometric pressure in hectoPascals"""
         self._perform_reading()
+        return self._calc_pressure()
+
+    @property
+    def humidity(self):
+        """The relative humidity in RH %"""
+        self._perform_reading()
+        return self._calc_humidity()
+
+    def read_all(self):
+        """Perform at most one measurement cycle and return every compensated value from it,
+           as a tuple (temperature, humidity, pressure, gas). All values share the same
+           ``t_fine``, so they are consistent with each other."""
+        self._perform_reading()
+        return (self._calc_temperature(), self._calc_humidity(), self._calc_pressure(),
+                self._calc_gas())
+
+    def _calc_temperature(self):
+        """Compensated temperature from the last reading."""
+        calc_temp = (((self._t_fine * 5) + 128) / 256)
+        return calc_temp / 100
+
+    def _calc_pressure(self):
+        """Compensated pressure from the last reading."""
         var1 = (self._t_fine / 2) - 64000
         var2 = ((var1 / 4) * (var1 / 4)) / 2048
         var2 = (var2 * self._pressure_calibration[5]) / 4
@@ -208,10 +258,8 @@ class BME680(i2c.I2C):
         calc_pres += ((var1 + var2 + var3 + (self._pressure_calibration[6] * 128)) / 16)
         return calc_pres / 100
 
-    @property
-    def humidity(self):
-        """The relative humidity in RH %"""
-        self._perform_reading()
+    def _calc_humidity(self):
+        """Compensated humidity from the last reading."""
         temp_scaled = ((self._t_fine * 5) + 128) / 256
         var1 = ((self._adc_hum - (self._humidity_calibration[0] * 16)) -
                 ((temp_scaled * self._humidity_calibration[2]) / 200))
@@ -244,6 +292,10 @@ class BME680(i2c.I2C):
     def gas(self):
         """The gas resistance in ohms"""
         self._perform_reading()
+        return self._calc_gas()
+
+    def _calc_gas(self):
+        """Compensated gas resistance from the last reading."""
         var1 = ((1340 + (5 * self._sw_err)) * (_LOOKUP_TABLE_1[self._gas_range])) / 65536
         var2 = ((self._adc_gas * 32768) - 16777216) + var1
         var3 = (_LOOKUP_TABLE_2[self._gas_range] * var1) / 512
@@ -279,31 +331,56 @@ class BME680(i2c.I2C):
     def _perform_reading(self):
         """Perform a single-shot reading from the sensor and fill internal data structure for
            calculations"""
-        if timers.now() - self._last_reading < self._min_refresh_time:
+        # the first reading is always taken, even right after boot
+        if self._t_fine is not None and timers.now() - self._last_reading < self._min_refresh_time:
             return
-
-        # turn on temp oversample & pressure oversample
-        self._write(_BME680_REG_CTRL_MEAS,
-                    [(self._temp_oversample << 5) | (self._pressure_oversample << 2)])
+        start_transactions = self.transactions
+
+        # heater settings only need recomputing when their inputs change
+        key = (self.ambient_temperature, self.heater_temperature, self.heater_duration)
+        if key != self._heat_key:
+            self._res_wait = self._calc_heater_duration(self.heater_duration)
+            self._res_heat = self._calc_heater_resistance(self.heater_temperature)
+            self._heat_key = key
+
+        # write the configuration registers that changed, then trigger,
+        # all in one transaction (CTRL_HUM takes effect on the CTRL_MEAS write)
+        pairs = []
         # turn on humidity oversample
-        self._write(_BME680_REG_CTRL_HUM, [self._humidity_oversample])
+        self._stage(pairs, _BME680_REG_CTRL_HUM, self._humidity_oversample)
         # set filter
-        self._write(_BME680_REG_CONFIG, [self._filter << 2])
+        self._stage(pairs, _BME680_REG_CONFIG, self._filter << 2)
         # set heater
-        self._write(_BME680_BME680_RES_WAIT_0, [self._calc_heater_duration(150)])
-        self._write(_BME680_BME680_RES_HEAT_0, [self._calc_heater_resistance(300)])
+        self._stage(pairs, _BME680_BME680_RES_WAIT_0, self._res_wait)
+        self._stage(pairs, _BME680_BME680_RES_HEAT_0, self._res_heat)
         # gas measurements enabled
-        self._write(_BME680_REG_CTRL_GAS, [_BME680_RUNGAS])
-
-        ctrl = self._read_byte(_BME680_REG_CTRL_MEAS)
-        ctrl = (ctrl & 0xFC) | 0x01  # enable single shot!
-        self._write(_BME680_REG_CTRL_MEAS, [ctrl])
-        new_data = False
-        while not new_data:
+        self._stage(pairs, _BME680_REG_CTRL_GAS, _BME680_RUNGAS)
+        # temp oversample & pressure oversample, enable single shot!
+        ctrl = (self._temp_oversample << 5) | (self._pressure_oversample << 2)
+        pairs.append(_BME680_REG_CTRL_MEAS)
+        pairs.append(ctrl | 0x01)
+        self._write_pairs(pairs)
+        start = timers.now()
+        # the registers hold the staged values only once the write went through
+        # (a failed write leaves the cache as it was, so the next reading retries)
+        for i in range(0, len(pairs) - 2, 2):
+            self._shadow[pairs[i]] = pairs[i + 1]
+
+        # sleep once for the expected duration, then read status and data together
+        self.predicted_wait = self.measurement_duration()
+        sleep(self.predicted_wait)
+        polls = 0
+        while True:
             data = self._read(_BME680_REG_MEAS_STATUS, 15)
-            new_data = data[0] & 0x80 != 0
-            sleep(5)
+            if data[0] & 0x80 != 0:
+                break
+            if polls >= _BME680_POLL_MAX:
+                raise new_exception(BME680_Exception, RuntimeError, "Measurement timeout")
+            polls += 1
+            sleep(_BME680_POLL_MS)
         self._last_reading = timers.now()
+        self.actual_wait = self._last_reading - start
+        self.extra_polls = polls
 
         self._adc_pres = _read24(data[2:5]) / 16
         self._adc_temp = _read24(data[5:8]) / 16
@@ -316,6 +393,30 @@ class BME680(i2c.I2C):
         var3 = ((var1 / 2) * (var1 / 2)) / 4096
         var3 = (var3 * self._temp_calibration[2] * 16) / 16384
         self._t_fine = int(var2 + var3)
+        self.last_transactions = self.transactions - start_transactions
+
+    def measurement_duration(self):
+        """Expected duration in milliseconds of a forced-mode measurement with the current
+           oversampling and heater settings"""
+        cycles = (_BME680_SAMPLERATES[self._temp_oversample] +
+                  _BME680_SAMPLERATES[self._pressure_oversample] +
+                  _BME680_SAMPLERATES[self._humidity_oversample])
+        duration = (cycles * _BME680_MEAS_CYCLE_US + _BME680_TPH_SWITCH_US +
+                    _BME680_GAS_MEAS_US + _BME680_WAKEUP_US)
+        # round up to the next millisecond
+        return (duration + 999) // 1000 + self.heater_duration
+
+    def _stage(self, pairs, register, value):
+        """Queue a register write in 'pairs' unless the register already holds 'value'.
+           The register cache is updated by the caller after the write succeeds"""
+        if self._shadow.get(register) != value:
+            pairs.append(register)
+            pairs.append(value)
+
+    def invalidate_registers(self):
+        """Forget the cached register contents, so the next reading rewrites the whole
+           configuration (e.g. after a reset of the sensor)"""
+        self._shadow = {}
 
     def _read_calibration(self):
         """Read & save the calibration coefficients"""
@@ -351,6 +452,7 @@ class BME680(i2c.I2C):
         try:
             # self.set_addr(self._address)
             result = self.write_read(bytes([register & 0xFF]), length, self.timeout)
+            self.transactions += 1
             if self._debug:
                 print("\t$%02X => %s" % (register, [hex(i) for i in result]))
         except Exception as e:
@@ -372,6 +474,7 @@ class BME680(i2c.I2C):
         try:
             # self.set_addr(self._address)
             self.write(buffer, self.timeout)
+            self.transactions += 1
             if self._debug:
                 print("\t$%02X <= %s" % (buffer[0], [hex(i) for i in buffer[1::2]]))
         except Exception as e:
@@ -380,3 +483,21 @@ class BME680(i2c.I2C):
             self.unlock()
         if ex is not None:
             raise ex
+
+    def _write_pairs(self, pairs):
+        """Writes a list of register, value pairs (not necessarily consecutive) in one
+           transaction"""
+        buffer = bytearray(pairs)
+        ex = None
+        self.lock()
+        try:
+            self.write(buffer, self.timeout)
+            self.transactions += 1
+            if self._debug:
+                print("\t<= %s" % [hex(i) for i in buffer])
+        except Exception as e:
+            ex = e
+        finally:
+            self.unlock()
+        if ex is not None:
+            raise ex
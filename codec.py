@@ -0,0 +1,239 @@
+# Telemetry serialization.
+#
+# Records are built as a dict of plain numbers and strings, then serialized
+# either as the JSON object expected by the cloud, or with a compact binary
+# encoding driven by the same field table:
+#
+#   version (1 byte) | timestamp (varint, seconds) | presence bitmap |
+#   present fields in table order
+#
+# Numbers are sent as zigzag varints of the value scaled by 10^decimals,
+# strings as a varint length followed by the UTF-8 bytes. Field IDs are the
+# positions in FIELDS, so new fields must only be appended.
+
+import json
+
+VERSION = 1
+STR = -1
+
+FIELDS = (
+    ("battery", 3),
+    ("temperature", 2),
+    ("pitch", 1),
+    ("roll", 1),
+    ("sigma", 3),
+    ("peak", 3),
+    ("zcr", 1),
+    ("latitude", 6),
+    ("longitude", 6),
+    ("altitude", 1),
+    ("speed", 1),
+    ("COG", 1),
+    ("nsat", 0),
+    ("HDOP", 2),
+    ("VDOP", 2),
+    ("PDOP", 2),
+    ("res_NO2", 0),
+    ("res_NH3", 0),
+    ("res_CO", 0),
+    ("res_VOC", 0),
+    ("air_temperature", 2),
+    ("air_humidity", 2),
+    ("air_pressure", 2),
+    ("vehicleType", STR),
+    ("rssi", 1),
+    ("rat", STR),
+    ("mcc", 0),
+    ("mnc", 0),
+    ("lac", STR),
+    ("cid", STR),
+    ("mode", 0),
+    ("vib1", 3),
+    ("vib2", 3),
+    ("vib3", 3),
+    ("vib4", 3),
+    ("vib5", 3),
+    ("event", STR),
+    ("event_peak", 2),
+    ("event_latency", 0),
+    ("ppm_CO", 2),
+    ("ppm_NO2", 2),
+    ("ppm_NH3", 2),
+    ("ppm_C3H8", 2),
+    ("ppm_C4H10", 2),
+    ("ppm_CH4", 2),
+    ("ppm_H2", 2),
+    ("ppm_C2H5OH", 2),
+    ("res_NH3_min", 0),
+    ("res_NH3_max", 0),
+    ("res_CO_min", 0),
+    ("res_CO_max", 0),
+    ("res_NO2_min", 0),
+    ("res_NO2_max", 0),
+    ("res_VOC_min", 0),
+    ("res_VOC_max", 0),
+    ("air_samples", 0),
+)
+
+_DECIMALS = {}
+for _f in FIELDS:
+    _DECIMALS[_f[0]] = _f[1]
+_SCALES = (1, 10, 100, 1000, 10000, 100000, 1000000)
+_BITMAP_LEN = (len(FIELDS) + 7) // 8
+
+def decimal(n, v):
+    """ Format `v` with `n` decimal digits. """
+    v = float(v)
+    s = "%%.%df" % n
+    s = s % v
+    if len(str(v)) < len(s):
+        return s[:-1] + '0'
+    return s
+
+def to_json(ts, values):
+    """
+    JSON record for the cloud, with timestamp `ts` (Unix seconds): numbers
+    with decimals in FIELDS are sent as formatted strings.
+    """
+    out = {}
+    for name in values:
+        v = values[name]
+        n = _DECIMALS.get(name)
+        if n is not None and n > 0:
+            v = decimal(n, v)
+        out[name] = v
+    return '{"ts":' + str(ts) + '000, "values":' + json.dumps(out) + '}'
+
+def pack_json(records):
+    """ Batch payload from JSON records. """
+    return "[" + ",".join(records) + "]"
+
+def pack_binary(records):
+    """ Batch payload from binary records (they are self-delimiting). """
+    buf = bytearray()
+    for r in records:
+        buf.extend(r)
+    return buf
+
+def _scaled(v, n):
+    v = float(v) * _SCALES[n]
+    if v < 0:
+        return -int(0.5 - v)
+    return int(v + 0.5)
+
+def max_size(str_len=16):
+    """
+    Size of a binary record with every field in FIELDS present, numbers of
+    up to 32 bits (5 varint bytes) and strings of up to `str_len` bytes.
+    """
+    n = 1 + 5 + _BITMAP_LEN
+    for f in FIELDS:
+        if f[1] == STR:
+            n += 1 + str_len
+        else:
+            n += 5
+    return n
+
+class Encoder:
+    """
+    Binary encoder writing into a preallocated buffer of `size` bytes (by
+    default enough for a record with all fields, see max_size()). A longer
+    record grows the buffer.
+    """
+    def __init__(self, size=None):
+        if size is None:
+            size = max_size()
+        self._buf = bytearray(size)
+        self._pos = 0
+
+    def _byte(self, b):
+        if self._pos == len(self._buf):
+            self._buf.extend(bytearray(len(self._buf) + 16))
+        self._buf[self._pos] = b
+        self._pos += 1
+
+    def _uvarint(self, v):
+        while v >= 0x80:
+            self._byte((v & 0x7F) | 0x80)
+            v >>= 7
+        self._byte(v)
+
+    def _svarint(self, v):
+        if v < 0:
+            self._uvarint(((-v) << 1) - 1)
+        else:
+            self._uvarint(v << 1)
+
+    def encode(self, ts, values):
+        """ Binary record of `values` with timestamp `ts` (Unix seconds). """
+        buf = self._buf
+        self._pos = 0
+        self._byte(VERSION)
+        self._uvarint(ts)
+        bitmap = self._pos
+        for i in range(_BITMAP_LEN):
+            self._byte(0)
+        for i in range(len(FIELDS)):
+            f = FIELDS[i]
+            v = values.get(f[0])
+            if v is None:
+                continue
+            buf[bitmap + (i >> 3)] |= 1 << (i & 7)
+            if f[1] == STR:
+                s = str(v).encode()
+                self._uvarint(len(s))
+                for b in s:
+                    self._byte(b)
+            else:
+                self._svarint(_scaled(v, f[1]))
+        return bytes(buf[0:self._pos])
+
+def _read_uvarint(data, pos):
+    v = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        v |= (b & 0x7F) << shift
+        if b < 0x80:
+            return (v, pos)
+        shift += 7
+
+def decode(data, pos=0):
+    """
+    Decode one binary record starting at `pos`. Returns (ts, values,
+    position after the record). Numbers with decimals are returned as
+    floats, the others as ints.
+    """
+    if data[pos] != VERSION:
+        raise ValueError("unsupported telemetry version")
+    ts, pos = _read_uvarint(data, pos + 1)
+    bitmap = pos
+    pos += _BITMAP_LEN
+    values = {}
+    for i in range(len(FIELDS)):
+        if not data[bitmap + (i >> 3)] & (1 << (i & 7)):
+            continue
+        name, n = FIELDS[i]
+        v, pos = _read_uvarint(data, pos)
+        if n == STR:
+            values[name] = bytes(data[pos:pos + v]).decode()
+            pos += v
+            continue
+        if v & 1:
+            v = -((v + 1) >> 1)
+        else:
+            v = v >> 1
+        if n > 0:
+            v = v / _SCALES[n]
+        values[name] = v
+    return (ts, values, pos)
+
+def decode_batch(data):
+    """ Decode a payload made by pack_binary() into a list of (ts, values). """
+    res = []
+    pos = 0
+    while pos < len(data):
+        ts, values, pos = decode(data, pos)
+        res.append((ts, values))
+    return res
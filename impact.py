@@ -0,0 +1,73 @@
+# Streaming impact and fall detection on acceleration samples.
+#
+# Works on the squared magnitude of each sample, in whatever unit the
+# samples are given (no square roots in the sampling path):
+#
+#   impact  the magnitude stays above `impact` for `impact_n` samples
+#   fall    an impact within `window_n` samples after the magnitude stayed
+#           below `freefall` for at least `freefall_n` samples
+#
+# After an event detection pauses for `holdoff_n` samples, so one shock is
+# reported once.
+
+IMPACT = 1
+FALL = 2
+NAMES = ("", "impact", "fall")
+
+class Detector:
+    """
+    Impact/fall state machine fed one sample at a time by add(). `peak`
+    holds the squared magnitude peak of the last event.
+    """
+    def __init__(self, impact, freefall, impact_n=2, freefall_n=8, window_n=100, holdoff_n=200):
+        self._imp2 = impact * impact
+        self._ff2 = freefall * freefall
+        self.impact_n = impact_n
+        self.freefall_n = freefall_n
+        self.window_n = window_n
+        self.holdoff_n = holdoff_n
+        self._above = 0
+        self._below = 0
+        self._after = window_n + 1
+        self._hold = 0
+        self._max = 0
+        self.peak = 0
+        self.impacts = 0
+        self.falls = 0
+
+    def add(self, x, y, z):
+        """ Process one sample. Returns IMPACT or FALL on detection, else 0. """
+        m = x*x + y*y + z*z
+        if self._hold > 0:
+            self._hold -= 1
+            return 0
+        if m < self._ff2:
+            self._below += 1
+        else:
+            if self._below >= self.freefall_n:
+                # a free fall just ended
+                self._after = 0
+            self._below = 0
+        if self._after <= self.window_n:
+            self._after += 1
+        if m <= self._imp2:
+            self._above = 0
+            self._max = 0
+            return 0
+        self._above += 1
+        if m > self._max:
+            self._max = m
+        if self._above < self.impact_n:
+            return 0
+        if self._after <= self.window_n:
+            kind = FALL
+            self.falls += 1
+        else:
+            kind = IMPACT
+            self.impacts += 1
+        self.peak = self._max
+        self._above = 0
+        self._max = 0
+        self._after = self.window_n + 1
+        self._hold = self.holdoff_n
+        return kind
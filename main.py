@@ -9,8 +9,25 @@ from fortebit.iot import iot
 from fortebit.iot import mqtt_client
 
 import timestamp
+import telemetry as tlm
+import codec
+import scheduler
 import timers
 
+# send telemetry with the compact binary encoding (the receiving side must
+# decode it with codec.decode_batch), instead of JSON
+_BINARY_TELEMETRY = False
+# lock wait/hold times and task loop lateness, printed and sent as a
+# diagnostics record every minute (must be set before the tasks are imported)
+_DIAGNOSTICS = False
+# air sensor watch mode: after each reading sleep until a gas channel moves
+# (ADC window comparator) or a minute passes, instead of measuring every
+# 800 ms; fewer readings, much less bus traffic (see airsensor.set_watch)
+_AIR_WATCH = False
+
+import probe
+probe.ENABLED = _DIAGNOSTICS
+
 import mcu
 import vm
 vm.set_option(vm.VM_OPT_RESET_ON_EXCEPTION, 1)
@@ -27,6 +44,7 @@ try:
 
     print("Initializing Air Sensor...")
     import airsensor
+    airsensor.set_watch(_AIR_WATCH)
     airsensor.start()
 
     if not polaris.isBatteryBackup():
@@ -60,21 +78,12 @@ try:
     # Setup network protocols
     from mqtt import mqtt
     mqtt.debug = True
-    import json
     import ssl
 
 except Exception as e:
     print("oops, exception!", e)
     mcu.reset()
 
-def decimal(n, v):
-    v = float(v)
-    s = "%%.%df" % n
-    s = s % v
-    if len(str(v)) < len(s):
-        return s[:-1] + '0'
-    return s
-
 def my_log(logstr):
     print(logstr)
 
@@ -97,72 +106,180 @@ try:
         print("Failed - reset!")
         mcu.reset()
     print("connected.")
+    connected = True
+
+    # readings are queued and sent in batches, surviving coverage gaps: records
+    # are held until 6 are queued or the oldest waited 30 s, so the modem
+    # wakes up once per batch rather than once per record (events are still
+    # published right away, below)
+    if _BINARY_TELEMETRY:
+        encoder = codec.Encoder()
+        queue = tlm.Queue(size=120, batch=6, min_batch=6, max_wait=30000, max_batches=2,
+                          pack=codec.pack_binary)
+    else:
+        queue = tlm.Queue(size=120, batch=6, min_batch=6, max_wait=30000, max_batches=2)
+    # only fields that changed beyond their dead-band, full record at least
+    # every minute (every record at longer publish periods)
+    delta = tlm.DeltaFilter(keyframe_ms=60000)
+
+    # publish period, GNSS rate and air sensor duty from motion, battery and link
+    sched = scheduler.Scheduler()
+    rssi = None
+
+    # queue drops seen so far: lost records may carry field updates
+    last_dropped = 0
+
+    # last timestamp sent and when, to date events without asking the modem
+    last_epoch = None
+    last_epoch_time = 0
+    # detection-to-publish time of the last event (ms), sent with the next record
+    event_latency = None
 
     last_time = 0
     last_time_debug = 0
+    last_time_diag = 0
+    main_loop = probe.loop("main", 1000)
     while True:
-        sleep(1000)
+        # sleeps 1 s, unless an impact or fall is detected
+        ev = accel.wait_event(1000)
+        if ev is not None:
+            # publish right away, ahead of the regular records
+            print("Event:", ev)
+            if last_epoch is not None:
+                epoch = last_epoch + (ev[1] - last_epoch_time) // 1000
+            else:
+                epoch = timestamp.to_unix(modem.rtc())
+            event = {'event': ev[0], 'event_peak': ev[2], 'vehicleType': 'bike'}
+            if _BINARY_TELEMETRY:
+                x = encoder.encode(epoch, event)
+            else:
+                x = codec.to_json(epoch, event)
+            try:
+                if not connected:
+                    raise Exception("not connected")
+                device.publish_telemetry(queue.pack([x]))
+                event_latency = timers.now() - ev[1]
+                print("Event published in", event_latency, "ms")
+            except Exception as e:
+                # keep it for the next flush
+                connected = False
+                queue.put(x, ev[1])
+                print("event publish failed, queued:", e)
+            continue
+
+        main_loop.tick()
         now_time = timers.now()
-        if now_time - last_time < 5000:
+
+        vib = accel.get_vibration()
+        sigma = vib[0]
+        batt = polaris.readBattVoltage()
+        if sched.update(sigma, polaris.isBatteryBackup(), batt, rssi, now_time):
+            print("Mode:", sched.mode_name(), "publish every", sched.publish_period)
+            gnss.set_rate(sched.gnss_rate)
+            airsensor.set_lowpower(not sched.air_on)
+
+        # the flush policy is checked on every tick, so a batch never waits
+        # much longer than max_wait, whatever the publish period. Offline,
+        # reconnecting is tried once per publish period
+        if queue.ready(now_time) and (connected or now_time - last_time >= sched.publish_period):
+            try:
+                reconnected = False
+                if not connected:
+                    device.connect()
+                    connected = True
+                    reconnected = True
+                    print("reconnected.")
+                polaris.ledRedOff()
+                n = queue.flush(device.publish_telemetry, now_time)
+                polaris.ledRedOn()
+                if reconnected:
+                    # back online: the next record carries every field
+                    delta.force_keyframe()
+                print("Published telemetry:", n, "records, queue stats", queue.stats())
+            except Exception as e:
+                connected = False
+                print("publish failed, queued:", queue.depth(), e)
+
+        if now_time - last_time < sched.publish_period:
             continue
         last_time = now_time
-        
-        sigma = accel.get_sigma()
-        if sigma < 0.1:
-            low_power = True
-        else:
-            low_power = False
-
-        if polaris.isBatteryBackup():
-            airsensor.set_lowpower(low_power)
 
         ts = modem.rtc()
         print("modem RTC =", ts)
+        # plain values, formatting is left to the codec
         telemetry = {}
         
-        telemetry['battery'] = decimal(3,polaris.readBattVoltage())
-        telemetry['temperature'] = decimal(2,accel.get_temperature())
+        telemetry['battery'] = batt
+        telemetry['temperature'] = accel.get_temperature()
 
         pr = accel.get_pitchroll()
-        telemetry['pitch'] = decimal(1,pr[0])
-        telemetry['roll'] = decimal(1,pr[1])
-        telemetry['sigma'] = decimal(3,sigma)
+        telemetry['pitch'] = pr[0]
+        telemetry['roll'] = pr[1]
+        telemetry['sigma'] = sigma
+        telemetry['peak'] = vib[1]
+        stats = accel.get_stats()
+        telemetry['zcr'] = (stats[0][3] + stats[1][3] + stats[2][3]) / 3
+        # vertical vibration per frequency band (vib1 is the lowest)
+        vb = accel.get_bands()
+        if vb is not None:
+            for i in range(len(vb)):
+                telemetry['vib' + str(i + 1)] = vb[i]
 
-        if not low_power:
+        if sched.read_gnss:
             if gnss.has_fix():
                 fix = gnss.fix()
                 print("gnss FIX =", fix)
                 # only transmit position when it's accurate
                 if fix[6] < 2.5:
-                    telemetry['latitude'] = decimal(6,fix[0])
-                    telemetry['longitude'] = decimal(6,fix[1])
-                    telemetry['altitude'] = decimal(1,fix[2])
-                    telemetry['speed'] = decimal(1,fix[3])
-                    telemetry['COG'] = decimal(1,fix[4])
+                    telemetry['latitude'] = fix[0]
+                    telemetry['longitude'] = fix[1]
+                    telemetry['altitude'] = fix[2]
+                    telemetry['speed'] = fix[3]
+                    telemetry['COG'] = fix[4]
                 telemetry['nsat'] = fix[5]
-                telemetry['HDOP'] = decimal(2,fix[6])
-                telemetry['VDOP'] = decimal(2,fix[7])
-                telemetry['PDOP'] = decimal(2,fix[8])
+                telemetry['HDOP'] = fix[6]
+                telemetry['VDOP'] = fix[7]
+                telemetry['PDOP'] = fix[8]
                 # replace timestamp
                 ts = fix[9]
 
+        # min/max/mean of the air readings since the previous record
+        iv = airsensor.get_interval()
         if airsensor.is_warmed_up():
             if airsensor.get_resistance(airsensor.GAS_NO2):
                 telemetry['res_NO2'] = int(airsensor.get_resistance(airsensor.GAS_NO2))
                 telemetry['res_NH3'] = int(airsensor.get_resistance(airsensor.GAS_NH3))
                 telemetry['res_CO'] = int(airsensor.get_resistance(airsensor.GAS_CO))
+                # every gas from the same reading, computed once per reading
+                ppm = airsensor.get_all_ppm()
+                if ppm is not None:
+                    for i in range(len(ppm)):
+                        telemetry['ppm_' + airsensor.PPM_NAMES[i]] = ppm[i]
             if airsensor.get_resistance(airsensor.GAS_VOC):
                 telemetry['res_VOC'] = int(airsensor.get_resistance(airsensor.GAS_VOC))
+            if iv is not None:
+                # the interval mean replaces the point reading
+                for i in range(4):
+                    name = 'res_' + airsensor.INTERVAL_NAMES[i]
+                    if name in telemetry:
+                        telemetry[name] = int(iv[1][i][2])
+                        telemetry[name + '_min'] = int(iv[1][i][0])
+                        telemetry[name + '_max'] = int(iv[1][i][1])
+                telemetry['air_samples'] = iv[0]
 
         thp = airsensor.get_temp_hum_press()
+        if thp is not None and iv is not None:
+            thp = (iv[1][4][2], iv[1][5][2], iv[1][6][2])
         if thp is not None and len(thp) == 3 and (thp[0] != 0 or thp[1] != 0 or thp[2] != 0):
-            telemetry['air_temperature'] = decimal(2,thp[0])
-            telemetry['air_humidity'] = decimal(2,thp[1])
-            telemetry['air_pressure'] = decimal(2,thp[2])
+            telemetry['air_temperature'] = thp[0]
+            telemetry['air_humidity'] = thp[1]
+            telemetry['air_pressure'] = thp[2]
 
         telemetry['vehicleType'] = 'bike'
+        telemetry['mode'] = sched.mode
         
-        telemetry['rssi'] = decimal(1,gsm.rssi())
+        rssi = gsm.rssi()
+        telemetry['rssi'] = rssi
         if now_time - last_time_debug >= 60000:
             last_time_debug = now_time
             ninfo = gsm.network_info()
@@ -174,13 +291,31 @@ try:
             telemetry['cid'] = ninfo[5]
 
         # add timestamp
-        epoch_ms = str(timestamp.to_unix(ts)) + "000"
-        x = '{"ts":' + epoch_ms + ', "values":' + json.dumps(telemetry) + '}'
+        epoch = timestamp.to_unix(ts)
+        last_epoch = epoch
+        last_epoch_time = now_time
+        if queue.dropped != last_dropped:
+            # the cloud missed some changes: send every field again
+            last_dropped = queue.dropped
+            delta.force_keyframe()
+        telemetry = delta.apply(telemetry, now_time)
+        if event_latency is not None:
+            # after the dead-band filter, so it is always sent once
+            telemetry['event_latency'] = event_latency
+            event_latency = None
+        if telemetry:
+            if _BINARY_TELEMETRY:
+                x = encoder.encode(epoch, telemetry)
+            else:
+                x = codec.to_json(epoch, telemetry)
+            queue.put(x, now_time)
 
-        polaris.ledRedOff()
-        msg = device.publish_telemetry(x)
-        polaris.ledRedOn()
-        print("Published telemetry:",msg)
+        if _DIAGNOSTICS and now_time - last_time_diag >= 60000:
+            last_time_diag = now_time
+            probe.dump()
+            # the binary encoding only carries the fields in codec.FIELDS
+            if not _BINARY_TELEMETRY:
+                queue.put(codec.to_json(epoch, probe.summary()), now_time)
 
         # debug GPS thread
         if not gnss.is_running():
@@ -4,11 +4,19 @@ import struct
 _CHANNEL_NO2 = 4
 _CHANNEL_NH3 = 5
 _CHANNEL_CO = 6
+# order of the values returned by measure()
+_CHANNELS = (_CHANNEL_NH3, _CHANNEL_CO, _CHANNEL_NO2)
 
 _PULLUP_NO2 = 15.0e3
 _PULLUP_NH3 = 1.1e6
 _PULLUP_CO = 1.1e6
 
+# ADS1015 data rate of the scans (0 = 128 SPS). The converter is below one
+# LSB of noise at every rate, so fast conversions only add reads: 8 conversions
+# at 128 SPS integrate 62 ms of each input, 64 at 1600 SPS only 40 ms (spread
+# over the ~90 ms it takes to read them), for 8 times the I2C transactions
+_SPS = 0
+
 def _saturate(v,min,max):
     if v > max:
         v = max
@@ -18,38 +26,49 @@ def _saturate(v,min,max):
 
 class AirQuality5:
 
-    def __init__(self, i2cdrv, address=0x48, clk=100000):
+    def __init__(self, i2cdrv, address=0x48, clk=100000, samples=8, rdy_pin=None, sps=_SPS):
         self.ads = ads1015.ADS1015(i2cdrv, address, clk)
-        self.ads.set(os=0, pga=1, mode=1, sps=4)  # standby
+        # ALERT/RDY signals conversion ready (polled if rdy_pin is not wired)
+        self.ads.enable_ready(rdy_pin)
+        self.ads.set(os=0, pga=1, mode=1, sps=sps)  # standby
+        self.samples = samples
+        self.sps = sps
+        self.last_raw = None
 
     def _read_adc(self):
         r = self.ads.read_register(ads1015.REG_CONV, 2)
         v = struct.unpack(">h",r)[0] >> 4
         return v
 
-    def _read_ch(self, channel):
-        # calc average over 64 samples
-        self.ads.set(ch=channel, os=0, pga=1, mode=0, sps=4)
-        sum = 0.0
-        for i in range(0, 64):
-            sleep(1)
-            sum += self._read_adc()
-        self.ads.set(os=0, pga=1, mode=1, sps=4)  # standby
+    def measure(self):
+        # average of all channels in one scan (returns to standby when done)
+        raw = self.ads.scan(_CHANNELS, self.samples, pga=1, sps=self.sps)
+        self.last_raw = raw
         # adc raw value are 12-bit signed (-2048,+2047), 1 LSB = VDD / 2048
         # pga gain is 0.5, output value is milliVolts
-        return sum * (2.0 / 64.0) # max positive value
-
-    def measure(self):
-        v = self._read_ch(_CHANNEL_NH3)
+        v = _saturate(raw[0] * 2.0,0,3300)
         #print(v)
-        v = _saturate(v,0,3300)
         r0 = _PULLUP_NH3 * v / (3301 - v)
-        v = self._read_ch(_CHANNEL_CO)
+        v = _saturate(raw[1] * 2.0,0,3300)
         #print(v)
-        v = _saturate(v,0,3300)
         r1 = _PULLUP_CO * v / (3301 - v)
-        v = self._read_ch(_CHANNEL_NO2)
+        v = _saturate(raw[2] * 2.0,0,3300)
         #print(v)
-        v = _saturate(v,0,3300)
         r2 = _PULLUP_NO2 * v / (3301 - v)
         return (r0, r1, r2)
+
+    def arm(self, index, band):
+        # comparator on channel index (same order as measure()), tripping when the
+        # value moves more than band (fraction) away from the last measurement
+        raw = self.last_raw[index]
+        d = abs(raw) * band
+        if d < 2:
+            d = 2
+        self.ads.arm(_CHANNELS[index], int(raw - d), int(raw + d) + 1, pga=1)
+
+    def wait_alarm(self, timeout):
+        # True if the armed channel left its band before timeout (ms)
+        return self.ads.wait_alert(timeout) is not None
+
+    def disarm(self):
+        self.ads.disarm()
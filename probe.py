@@ -0,0 +1,159 @@
+# Lightweight instrumentation of the shared locks and of the task loops.
+#
+# Set ENABLED before importing the instrumented modules: lock() and loop()
+# are called when those modules load, and with instrumentation off they
+# return a plain threading.Lock and a no-op loop recorder, so the tasks pay
+# nothing (or one empty call per loop iteration).
+#
+# Times are in milliseconds, as returned by timers.now().
+
+import threading
+import timers
+
+ENABLED = False
+
+# upper bounds (ms) of the loop lateness histogram bins; the last bin is open
+BINS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_locks = []
+_loops = []
+
+class Lock:
+    """
+    threading.Lock recording how long callers wait for it and how long it
+    is held. Statistics are updated while holding the lock.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._since = 0
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0
+        self.wait_max = 0
+        self.hold_total = 0
+        self.hold_max = 0
+
+    def acquire(self):
+        t = timers.now()
+        if self._lock.acquire(False):
+            wait = 0
+        else:
+            self._lock.acquire()
+            self.contended += 1
+            wait = timers.now() - t
+        self.acquisitions += 1
+        self.wait_total += wait
+        if wait > self.wait_max:
+            self.wait_max = wait
+        self._since = timers.now()
+        return True
+
+    def release(self):
+        hold = timers.now() - self._since
+        self.hold_total += hold
+        if hold > self.hold_max:
+            self.hold_max = hold
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def stats(self):
+        """ (acquisitions, contended, total wait, max wait, total hold, max hold) """
+        return (self.acquisitions, self.contended, self.wait_total, self.wait_max,
+                self.hold_total, self.hold_max)
+
+class Loop:
+    """
+    Recorder of a periodic task loop: tick() is called once per iteration,
+    and the time since the previous tick is compared with the nominal
+    `period`. The lateness includes the work done in the iteration.
+    """
+    def __init__(self, name, period):
+        self.name = name
+        self.period = period
+        self._last = None
+        self.ticks = 0
+        self.late_total = 0
+        self.late_max = 0
+        self.hist = [0] * (len(BINS) + 1)
+
+    def tick(self):
+        now = timers.now()
+        if self._last is not None:
+            late = now - self._last - self.period
+            self.ticks += 1
+            if late > 0:
+                self.late_total += late
+                if late > self.late_max:
+                    self.late_max = late
+            i = 0
+            while i < len(BINS) and late >= BINS[i]:
+                i += 1
+            self.hist[i] += 1
+        self._last = now
+
+    def stats(self):
+        """ (intervals, average lateness, max lateness, histogram list) """
+        avg = 0
+        if self.ticks > 0:
+            avg = self.late_total / self.ticks
+        return (self.ticks, avg, self.late_max, list(self.hist))
+
+class _NullLoop:
+    def tick(self):
+        pass
+
+_NULL_LOOP = _NullLoop()
+
+def lock(name):
+    """ A lock for module state, instrumented when ENABLED. """
+    if not ENABLED:
+        return threading.Lock()
+    l = Lock(name)
+    _locks.append(l)
+    return l
+
+def loop(name, period):
+    """ A loop recorder for a task with nominal `period` ms, no-op unless ENABLED. """
+    if not ENABLED:
+        return _NULL_LOOP
+    l = Loop(name, period)
+    _loops.append(l)
+    return l
+
+def report():
+    """ Readable statistics of every lock and loop, as a list of lines. """
+    lines = []
+    for l in _locks:
+        s = l.stats()
+        lines.append("lock %s: %d acq, %d contended, wait %d ms (max %d), hold %d ms (max %d)" %
+                     (l.name, s[0], s[1], s[2], s[3], s[4], s[5]))
+    for l in _loops:
+        s = l.stats()
+        lines.append("loop %s: %d ticks, late avg %.1f ms max %d ms, hist %s" %
+                     (l.name, s[0], s[1], s[2], s[3]))
+    return lines
+
+def dump():
+    """ Print report() (on the console stream). """
+    for line in report():
+        print(line)
+
+def summary():
+    """
+    Flat dict of the main figures, for a diagnostics telemetry record:
+    lk_<name>_wait / _hold (max, ms), lk_<name>_cont (contended
+    acquisitions) and jit_<name> / jit_<name>_avg (loop lateness, ms).
+    """
+    d = {}
+    for l in _locks:
+        d["lk_" + l.name + "_wait"] = l.wait_max
+        d["lk_" + l.name + "_hold"] = l.hold_max
+        d["lk_" + l.name + "_cont"] = l.contended
+    for l in _loops:
+        s = l.stats()
+        d["jit_" + l.name] = s[2]
+        d["jit_" + l.name + "_avg"] = s[1]
+    return d
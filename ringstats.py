@@ -0,0 +1,179 @@
+# Fixed-size ring buffer of 3-axis samples with running window statistics.
+#
+# Storage is allocated once in the constructor and every statistic is kept
+# as a running value updated when a sample enters or leaves the window, so
+# adding a sample costs the same regardless of the window length: mean and
+# variance are updated from the deviations from the running mean (no large
+# sums of squares to subtract), the peak comes from a monotonic queue of
+# the deviations that may still become the window maximum.
+
+import math
+
+class Window:
+    """
+    Keeps the last `window` samples (at most `size`) of three axes together
+    with their deviation from a reference (e.g. a low-pass filtered value),
+    and maintains per axis: mean, variance, peak absolute deviation and the
+    number of zero crossings of the deviation.
+    """
+    def __init__(self, size, window=None):
+        self.size = size
+        self._buf = ([0.0] * size, [0.0] * size, [0.0] * size)
+        # peak candidates per axis, a ring of decreasing absolute deviations
+        # and the sample number they were added at
+        self._qv = ([0.0] * size, [0.0] * size, [0.0] * size)
+        self._qt = ([0] * size, [0] * size, [0] * size)
+        # bit n set when axis n deviation changed sign at this sample
+        self._zc = bytearray(size)
+        if window is None:
+            window = size
+        self.set_window(window)
+
+    def set_window(self, window):
+        """ Change the window length (1..size) and clear the statistics. """
+        if window < 1:
+            window = 1
+        if window > self.size:
+            window = self.size
+        self.window = window
+        self.count = 0
+        self.total = 0
+        self._head = 0
+        self._mean = [0.0, 0.0, 0.0]
+        # sum of squared deviations from the mean
+        self._m2 = [0.0, 0.0, 0.0]
+        self._cross = [0, 0, 0]
+        self._neg = 0
+        # first slot and length of each peak queue
+        self._qh = [0, 0, 0]
+        self._qn = [0, 0, 0]
+
+    def add(self, x, y, z, dx, dy, dz):
+        """ Push one sample (`x,y,z`) and its deviation (`dx,dy,dz`). """
+        i = self._head
+        full = self.count == self.window
+        flags = 0
+        neg = 0
+        if dx < 0:
+            neg |= 1
+        if dy < 0:
+            neg |= 2
+        if dz < 0:
+            neg |= 4
+        if self.total > 0:
+            flags = neg ^ self._neg
+        self._neg = neg
+        old = self._zc[i]
+        self._zc[i] = flags
+        self._add_axis(0, i, x, dx, full, old & 1, flags & 1)
+        self._add_axis(1, i, y, dy, full, old & 2, flags & 2)
+        self._add_axis(2, i, z, dz, full, old & 4, flags & 4)
+        self.total += 1
+        if not full:
+            self.count += 1
+        i += 1
+        if i == self.window:
+            i = 0
+            # once per lap recompute the sums to cancel rounding drift
+            self._resum()
+        self._head = i
+
+    def _add_axis(self, a, i, v, d, full, old_cross, cross):
+        buf = self._buf[a]
+        m = self._mean[a]
+        if full:
+            # replace the oldest sample, the count stays the same
+            o = buf[i]
+            n = self.count
+            mn = m + (v - o) / n
+            self._m2[a] += (v - o) * (v - mn + o - m)
+            if old_cross:
+                self._cross[a] -= 1
+        else:
+            n = self.count + 1
+            mn = m + (v - m) / n
+            self._m2[a] += (v - m) * (v - mn)
+        self._mean[a] = mn
+        buf[i] = v
+        if cross:
+            self._cross[a] += 1
+        # sliding maximum: drop the candidates that can no longer be the
+        # peak (smaller and older than d) and the one leaving the window;
+        # each deviation enters and leaves the queue once
+        if d < 0:
+            d = -d
+        qv = self._qv[a]
+        qt = self._qt[a]
+        h = self._qh[a]
+        k = self._qn[a]
+        size = self.size
+        while k > 0:
+            j = h + k - 1
+            if j >= size:
+                j -= size
+            if qv[j] > d:
+                break
+            k -= 1
+        j = h + k
+        if j >= size:
+            j -= size
+        qv[j] = d
+        qt[j] = self.total
+        k += 1
+        if self.total - qt[h] >= self.window:
+            h += 1
+            if h == size:
+                h = 0
+            k -= 1
+        self._qh[a] = h
+        self._qn[a] = k
+
+    def _resum(self):
+        for a in range(3):
+            buf = self._buf[a]
+            n = self.count
+            s = 0.0
+            for j in range(n):
+                s += buf[j]
+            m = s / n
+            q = 0.0
+            for j in range(n):
+                e = buf[j] - m
+                q += e * e
+            self._mean[a] = m
+            self._m2[a] = q
+
+    def mean(self, a):
+        """ Mean of axis `a` over the window. """
+        if self.count == 0:
+            return 0.0
+        return self._mean[a]
+
+    def variance(self, a):
+        """ Variance of axis `a` over the window. """
+        if self.count == 0:
+            return 0.0
+        v = self._m2[a] / self.count
+        if v < 0:
+            v = 0.0
+        return v
+
+    def rms(self, a):
+        """ RMS of axis `a` around its mean (standard deviation). """
+        return math.sqrt(self.variance(a))
+
+    def peak(self, a):
+        """ Largest absolute deviation of axis `a` over the window. """
+        if self._qn[a] == 0:
+            return 0.0
+        return self._qv[a][self._qh[a]]
+
+    def crossings(self, a):
+        """ Zero crossings of the deviation of axis `a` over the window. """
+        return self._cross[a]
+
+    def zcr(self, a):
+        """ Zero crossings per sample of axis `a` over the window. """
+        if self.count < 2:
+            return 0.0
+        return self._cross[a] / (self.count - 1)
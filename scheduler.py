@@ -0,0 +1,99 @@
+# Adaptive duty-cycle scheduler.
+#
+# Picks the telemetry publish period, the GNSS update rate and whether the
+# GNSS fix and air sensor are used, from motion (accelerometer sigma), power
+# source and battery voltage, and link quality (RSSI), using policy tables.
+
+MODE_MOVING = 0  # external power, moving
+MODE_PARKED = 1  # external power, not moving
+MODE_BATT_MOVING = 2  # battery backup, moving
+MODE_BATT_PARKED = 3  # battery backup, not moving
+MODE_CRITICAL = 4  # battery backup, low voltage
+
+MODE_NAMES = ("moving", "parked", "batt-moving", "batt-parked", "critical")
+
+# publish period (ms), GNSS rate (ms), read GNSS fix, air sensor on
+POLICY = (
+    (5000, 2000, True, True),
+    (15000, 5000, False, True),
+    (5000, 2000, True, True),
+    (60000, 10000, False, False),
+    (300000, 10000, False, False),
+)
+
+class Scheduler:
+    """
+    Evaluates the operating mode with update() and exposes its settings as
+    `publish_period`, `gnss_rate`, `read_gnss` and `air_on`.
+
+    Motion is detected when sigma (vibration RMS over the accelerometer
+    window) reaches `motion` (m/s^2); the device is considered parked only
+    after `hold` consecutive evaluations below it. Lying still, sensor noise
+    alone gives about 0.02 m/s^2, a gentle ride 0.5 m/s^2.
+    Below `low_batt` volts on battery backup the critical mode is used.
+    With RSSI under `weak_rssi` (dBm) the publish period is multiplied by
+    `weak_factor`: fewer records are built, so the queue fills its batches
+    (and wakes the modem) less often. Batch sizes are up to the queue.
+    """
+    def __init__(self, policy=POLICY, motion=0.08, hold=10, low_batt=3.5, weak_rssi=-95, weak_factor=2):
+        self.policy = policy
+        self.motion = motion
+        self.hold = hold
+        self.low_batt = low_batt
+        self.weak_rssi = weak_rssi
+        self.weak_factor = weak_factor
+        self._still = hold
+        self._since = None
+        self.mode = None
+        self.weak_link = False
+        self.transitions = 0
+        self.time_in_mode = [0] * len(policy)
+        self._apply(MODE_MOVING, False)
+
+    def _apply(self, mode, weak):
+        p = self.policy[mode]
+        self.mode = mode
+        self.weak_link = weak
+        self.publish_period = p[0]
+        if weak:
+            self.publish_period *= self.weak_factor
+        self.gnss_rate = p[1]
+        self.read_gnss = p[2]
+        self.air_on = p[3]
+
+    def update(self, sigma, battery_backup, voltage, rssi, now):
+        """
+        Re-evaluate the mode at time `now` (ms). Returns True if the mode
+        (or the link condition) changed and the settings must be applied.
+        """
+        if self._since is not None:
+            self.time_in_mode[self.mode] += now - self._since
+        self._since = now
+
+        if sigma >= self.motion:
+            self._still = 0
+        elif self._still < self.hold:
+            self._still += 1
+        moving = self._still < self.hold
+
+        if battery_backup:
+            if voltage < self.low_batt:
+                mode = MODE_CRITICAL
+            elif moving:
+                mode = MODE_BATT_MOVING
+            else:
+                mode = MODE_BATT_PARKED
+        elif moving:
+            mode = MODE_MOVING
+        else:
+            mode = MODE_PARKED
+
+        weak = rssi is not None and rssi < self.weak_rssi
+        if mode == self.mode and weak == self.weak_link:
+            return False
+        self._apply(mode, weak)
+        self.transitions += 1
+        return True
+
+    def mode_name(self):
+        return MODE_NAMES[self.mode]
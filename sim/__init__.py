@@ -0,0 +1,291 @@
+# Host-side simulation of the Polaris board.
+#
+# Runs the demo modules unchanged in CPython: the Zerynth builtins and the
+# i2c, spi, timers, threading, mcu, vm and board library modules are
+# replaced by stand-ins working in virtual time, and the sensors are
+# register-level models attached to the simulated buses. This allows
+# measuring bus occupancy, driver timing, interrupt behavior and published
+# traffic without hardware.
+#
+# Typical use::
+#
+#     import sim
+#     s = sim.Simulation()
+#     s.install()
+#     import accel
+#     accel.start()
+#     s.run(10000)
+#     print(s.format_report())
+#
+# or run the whole demo with ``python -m sim [seconds]``. Application
+# modules imported while the simulation is installed are dropped again by
+# uninstall(), so every Simulation starts from freshly imported modules.
+
+import os
+import sys
+import types
+import builtins
+import threading as _threading
+# modules main.py imports that must come from CPython, not the stand-ins
+import json
+import ssl
+
+from sim import kernel
+from sim import bus
+from sim import devices
+from sim import platform
+
+# per-transaction overhead of the drivers and bus turnaround (us)
+_I2C_OVERHEAD = 60
+_SPI_OVERHEAD = 15
+
+_LIS_CS = "D60"
+_ADS_ADDRESS = 0x48
+_BME_ADDRESS = 0x77
+
+# MCU pins the tools wire to LIS2HH12 INT1 and ADS1015 ALERT/RDY
+ACCEL_INT_PIN = "D5"
+ALERT_PIN = "D6"
+
+class Simulation:
+    """
+    Virtual Polaris board. The default sensor models can be replaced or
+    tuned through `lis2hh12`, `ads1015` and `bme680` before install().
+
+    `accel_int_pin` and `alert_pin` wire the LIS2HH12 INT1 and the ADS1015
+    ALERT/RDY outputs to MCU pins; configure() hands them to the
+    application modules, so that their interrupt and ready-pin paths run.
+    """
+    def __init__(self, accel_signal=devices.still, accel_int_pin=None, alert_pin=None):
+        self.kernel = kernel.Kernel()
+        self.accel_int_pin = accel_int_pin
+        self.alert_pin = alert_pin
+        self.pins = platform.Pins()
+        self.board = platform.Board(self)
+        self.gsm = platform.GsmModule(self)
+        self.messages = []
+        self.link_down = False
+        self._buses = {}
+        self._saved = None
+        self._loaded = set()
+
+        self.lis2hh12 = devices.LIS2HH12Model(self, accel_signal, accel_int_pin)
+        self.bus("SPI1").attach(_LIS_CS, self.lis2hh12)
+        self.ads1015 = devices.ADS1015Model(self, alert_pin=alert_pin)
+        self.bus("I2C0").attach(_ADS_ADDRESS, self.ads1015)
+        self.bme680 = devices.BME680Model(self)
+        self.bus("I2C0").attach(_BME_ADDRESS, self.bme680)
+
+    def bus(self, name):
+        """ The simulated bus peripheral `name` (e.g. "I2C0", "SPI1"). """
+        b = self._buses.get(name)
+        if b is None:
+            overhead = _SPI_OVERHEAD
+            if name.startswith("I2C"):
+                overhead = _I2C_OVERHEAD
+            b = bus.Bus(self, name, overhead)
+            self._buses[name] = b
+        return b
+
+    # --- stand-in modules and builtins ---
+
+    def _modules(self):
+        k = self.kernel
+        mods = {}
+
+        def module(name, **attrs):
+            m = types.ModuleType(name)
+            for a in attrs:
+                setattr(m, a, attrs[a])
+            mods[name] = m
+            return m
+
+        bus.I2C.sim = self
+        bus.Spi.sim = self
+        platform.MqttClient.sim = self
+
+        module("i2c", I2C=bus.I2C)
+        module("spi", Spi=bus.Spi)
+
+        def now():
+            return int(k.now)
+        module("timers", now=now)
+
+        th = module("threading",
+                    Lock=lambda: kernel.Lock(k),
+                    Event=lambda: kernel.Event(k))
+        # anything else (used by CPython itself) comes from the real module
+        th.__getattr__ = lambda name: getattr(_threading, name)
+
+        module("mcu", reset=platform.reset, uid=platform.uid)
+        module("vm", set_option=lambda opt, value: None,
+               VM_OPT_RESET_ON_EXCEPTION=1, VM_OPT_TRACE_ON_EXCEPTION=2,
+               VM_OPT_RESET_ON_HARDFAULT=3, VM_OPT_TRACE_ON_HARDFAULT=4)
+        module("streams")
+
+        module("fortebit")
+        module("fortebit.polaris", polaris=self.board)
+        iot = module("fortebit.iot")
+        iot.iot = module("fortebit.iot.iot", Device=platform.Device)
+        iot.mqtt_client = module("fortebit.iot.mqtt_client", MqttClient=platform.MqttClient)
+        mods["fortebit"].polaris = mods["fortebit.polaris"]
+        mods["fortebit"].iot = iot
+
+        module("wireless", gsm=self.gsm)
+        l76 = module("quectel.l76.l76", debug=False)
+        module("quectel.l76", l76=l76)
+        module("quectel", l76=mods["quectel.l76"])
+        module("mqtt", mqtt=module("mqtt.mqtt", debug=False))
+        return mods
+
+    def _builtins(self):
+        k = self.kernel
+        pins = self.pins
+
+        def thread(fn, *args):
+            name = fn.__name__
+            if args and type(args[-1]) == str:
+                name = args[-1]
+            return k.spawn(fn, args, name)
+
+        names = {
+            "sleep": k.sleep,
+            "thread": thread,
+            "onPinRise": pins.on_rise,
+            "onPinFall": pins.on_fall,
+            "new_exception": platform.new_exception,
+        }
+        for i in range(128):
+            names["D%d" % i] = "D%d" % i
+        for i in range(3):
+            names["SPI%d" % i] = "SPI%d" % i
+            names["I2C%d" % i] = "I2C%d" % i
+        return names
+
+    def install(self):
+        """ Replace the Zerynth modules and builtins with the simulated ones. """
+        if self._saved is not None:
+            return
+        mods = self._modules()
+        names = self._builtins()
+        saved_mods = {}
+        self._loaded = set(sys.modules)
+        for n in mods:
+            saved_mods[n] = sys.modules.get(n)
+            sys.modules[n] = mods[n]
+        saved_names = {}
+        for n in names:
+            saved_names[n] = getattr(builtins, n, None)
+            setattr(builtins, n, names[n])
+        self._saved = (saved_mods, saved_names)
+
+    def uninstall(self):
+        """ Restore the CPython modules and builtins. """
+        if self._saved is None:
+            return
+        saved_mods, saved_names = self._saved
+        # application modules hold drivers bound to this board
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        here = os.path.dirname(os.path.abspath(__file__))
+        drop = []
+        for n in sys.modules:
+            if n in self._loaded:
+                continue
+            m = sys.modules[n]
+            f = getattr(m, "__file__", None)
+            if f is None:
+                # namespace packages (e.g. the vendor directories) have a path only
+                f = list(getattr(m, "__path__", None) or ("",))[0]
+            if not f:
+                continue
+            f = os.path.abspath(f)
+            if f.startswith(root + os.sep) and not f.startswith(here + os.sep):
+                drop.append(n)
+        for n in drop:
+            del sys.modules[n]
+        for n in saved_mods:
+            if saved_mods[n] is None:
+                del sys.modules[n]
+            else:
+                sys.modules[n] = saved_mods[n]
+        for n in saved_names:
+            if saved_names[n] is None:
+                delattr(builtins, n)
+            else:
+                setattr(builtins, n, saved_names[n])
+        self._saved = None
+
+    def configure(self):
+        """
+        Import the application modules and set their pin settings from
+        `accel_int_pin` and `alert_pin` (None keeps sleep polling). Call
+        after install() and before their start().
+        """
+        import accel
+        import airsensor
+        accel._ACCEL_INT_PIN = self.accel_int_pin
+        airsensor._AIR_ALERT_PIN = self.alert_pin
+
+    # --- running ---
+
+    def run(self, ms):
+        """ Let the simulated threads run for `ms` milliseconds of virtual time. """
+        self.kernel.sleep(ms)
+
+    def run_main(self, path, ms):
+        """ Execute the application script `path` for `ms` milliseconds of virtual time. """
+        import runpy
+        self.configure()
+
+        def main():
+            runpy.run_path(path, run_name="__main__")
+        self.kernel.spawn(main, (), "main")
+        self.run(ms)
+
+    def report(self):
+        """ Statistics of the run so far, as a dict. """
+        elapsed = self.kernel.now
+        buses = {}
+        for name in self._buses:
+            buses[name] = self._buses[name].stats(elapsed)
+        sent = 0
+        for m in self.messages:
+            sent += len(m[2])
+        return {
+            "time_ms": elapsed,
+            "buses": buses,
+            "lis2hh12": {
+                "samples": self.lis2hh12.samples,
+                "overruns": self.lis2hh12.overruns,
+                "int_edges": self.lis2hh12.int_edges,
+            },
+            "ads1015": {
+                "conversions": self.ads1015.conversions,
+                "alerts": self.ads1015.alerts,
+            },
+            "bme680": {
+                "measurements": self.bme680.measurements,
+            },
+            "mqtt": {
+                "messages": len(self.messages),
+                "bytes": sent,
+            },
+            "threads": list(self.kernel.threads),
+            "errors": [(n, repr(e)) for n, e in self.kernel.errors],
+        }
+
+    def format_report(self):
+        """ report() as readable text. """
+        r = self.report()
+        lines = ["virtual time: %.1f s" % (r["time_ms"] / 1000.0)]
+        for name in sorted(r["buses"]):
+            b = r["buses"][name]
+            lines.append("%s: %d transactions, %d bytes, busy %.1f ms (%.2f%%)" % (
+                name, b["transactions"], b["bytes"], b["busy_ms"], b["occupancy"] * 100))
+        for dev in ("lis2hh12", "ads1015", "bme680", "mqtt"):
+            items = sorted(r[dev].items())
+            lines.append(dev + ": " + ", ".join(["%s=%s" % (n, v) for n, v in items]))
+        lines.append("threads: " + ", ".join(r["threads"]))
+        for n, e in r["errors"]:
+            lines.append("thread %s ended with %s" % (n, e))
+        return "\n".join(lines)
@@ -0,0 +1,39 @@
+# Run the demo application on the simulated board:
+#
+#     python -m sim [seconds] [still|riding] [pins]
+#
+# and print the bus, sensor and traffic statistics at the end. With "pins"
+# the accelerometer interrupt and the ADC ready output are wired, otherwise
+# the modules poll as in their default configuration.
+
+import os
+import sys
+
+import sim
+from sim import devices
+
+def _main(argv):
+    seconds = 120
+    signal = devices.riding
+    pins = False
+    if len(argv) > 1:
+        seconds = float(argv[1])
+    if len(argv) > 2:
+        signal = getattr(devices, argv[2])
+    if len(argv) > 3:
+        pins = argv[3] == "pins"
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    if pins:
+        s = sim.Simulation(accel_signal=signal, accel_int_pin=sim.ACCEL_INT_PIN, alert_pin=sim.ALERT_PIN)
+    else:
+        s = sim.Simulation(accel_signal=signal)
+    s.install()
+    s.run_main(os.path.join(root, "main.py"), seconds * 1000)
+    print()
+    print(s.format_report())
+
+_main(sys.argv)
@@ -0,0 +1,235 @@
+# Per-call cost of the drivers and of the telemetry path, on the simulated
+# board:
+#
+#     python -m sim.bench [--iterations N] [--save FILE] [--baseline FILE]
+#
+# For every case it measures the host wall time per call, the virtual time
+# a call takes on the device, the bus transactions, bytes and virtual bus
+# time per call (the time the call keeps the bus busy on the device), and the
+# peak memory allocated by one call.
+# Block-processing cases also report the samples processed per second.
+# Results are printed as JSON; with --baseline they are compared against a
+# stored run and the exit status is 1 if a case got worse. Virtual time and
+# bus figures are deterministic and compared exactly, the others with a tolerance, since
+# they depend on the host.
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# allowed growth over the baseline before a metric counts as a regression
+TOLERANCE = {
+    "wall_us": 1.5,
+    "time_ms": 1.0,
+    "alloc_bytes": 1.1,
+    "transactions": 1.0,
+    "bytes": 1.0,
+    "bus_ms": 1.0,
+}
+
+# a full telemetry record as built by main.py
+RECORD = {
+    "battery": 4.012, "temperature": 27.5, "pitch": -1.5, "roll": 2.5,
+    "sigma": 0.512, "peak": 1.873, "zcr": 12.4,
+    "latitude": 45.464211, "longitude": 9.191383, "altitude": 122.4,
+    "speed": 18.2, "COG": 271.5, "nsat": 9,
+    "HDOP": 0.9, "VDOP": 1.2, "PDOP": 1.5,
+    "res_NO2": 8567, "res_NH3": 412003, "res_CO": 803112, "res_VOC": 246780,
+    "air_temperature": 27.16, "air_humidity": 50.41, "air_pressure": 1013.53,
+    "vehicleType": "bike", "rssi": -75, "rat": "LTE", "mcc": 222, "mnc": 10,
+    "lac": "1A2B", "cid": "00C0FFEE", "mode": 0,
+}
+RTC = (2019, 6, 15, 9, 0, 26)
+
+
+def _cases():
+    # imported here: the application modules need the simulation installed
+    import sim
+    import accel
+    import airsensor
+    import timestamp
+    import codec
+    import bands
+    import math
+
+    bme = airsensor._bme680
+    air5 = airsensor._air5
+    lis = accel._accel
+    # the same click with ALERT/RDY wired (airsensor polls it by default)
+    from mikroe import airquality5
+    air5_rdy = airquality5.AirQuality5(I2C0, rdy_pin=sim.ALERT_PIN)
+    # a valid snapshot for the getters
+    airsensor._snap = airsensor._update(airsensor._snap)
+
+    def bme_reading():
+        # defeat the refresh_rate cache, so every call measures
+        bme._last_reading = -bme._min_refresh_time
+        bme._perform_reading()
+
+    def bme_compensate():
+        bme._calc_temperature()
+        bme._calc_humidity()
+        bme._calc_pressure()
+        bme._calc_gas()
+
+    def ppm_all():
+        for gas in range(airsensor.GAS_CO, airsensor.GAS_C2H5OH + 1):
+            airsensor.get_ppm(gas)
+
+    def all_ppm():
+        # drop the cached result, so every call computes
+        airsensor._ppm = (None, None)
+        airsensor.get_all_ppm()
+
+    def to_unix():
+        timestamp.to_unix(RTC)
+
+    def to_json():
+        codec.to_json(timestamp.to_unix(RTC), RECORD)
+
+    encoder = codec.Encoder()
+    def encode():
+        encoder.encode(timestamp.to_unix(RTC), RECORD)
+
+    # one block of vertical vibration (counts) per call
+    be = bands.BandEnergy(accel._ACCEL_BLOCK, 1000 // accel._ACCEL_UPDATE, accel._ACCEL_BANDS)
+    block = [int(2000 * math.sin(0.7 * i) + 500 * math.sin(2.9 * i)) for i in range(be.size)]
+    def band_block():
+        for v in block:
+            be.add(v)
+        be.compute()
+
+    return (
+        ("lis2hh12.acceleration", lis.acceleration),
+        ("bme680.perform_reading", bme_reading),
+        ("bme680.compensate", bme_compensate),
+        ("airquality5.measure", air5.measure),
+        ("airquality5.measure_rdy", air5_rdy.measure),
+        ("airsensor.get_ppm", ppm_all),
+        ("airsensor.get_all_ppm", all_ppm),
+        ("timestamp.to_unix", to_unix),
+        ("telemetry.to_json", to_json),
+        ("telemetry.encode", encode),
+        ("bands.block", band_block, be.size),
+    )
+
+
+def _bus_totals(s):
+    t = 0
+    b = 0
+    busy = 0.0
+    for name in s._buses:
+        bus = s._buses[name]
+        t += bus.transactions
+        b += bus.bytes
+        busy += bus.busy
+    return (t, b, busy)
+
+
+def measure(s, fn, iterations, samples=None):
+    """
+    Metrics of `fn()` per call, on simulation `s`. With `samples` (processed
+    by each call), also the throughput in samples per second.
+    """
+    fn()  # warm up caches and lazy state
+
+    b0 = _bus_totals(s)
+    k0 = s.kernel.now
+    t0 = time.perf_counter()
+    for i in range(iterations):
+        fn()
+    wall = time.perf_counter() - t0
+    k1 = s.kernel.now
+    b1 = _bus_totals(s)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    res = {
+        "wall_us": wall * 1e6 / iterations,
+        "time_ms": round((k1 - k0) / iterations, 6),
+        "transactions": (b1[0] - b0[0]) / iterations,
+        "bytes": (b1[1] - b0[1]) / iterations,
+        "bus_ms": round((b1[2] - b0[2]) / iterations, 6),
+        "alloc_bytes": peak - base,
+    }
+    if samples is not None:
+        res["samples_per_s"] = samples * iterations / wall
+    return res
+
+
+def run(iterations=200):
+    """ Run every case on a fresh simulation; returns {case: metrics}. """
+    import sim
+    if _ROOT not in sys.path:
+        sys.path.insert(0, _ROOT)
+    # the ADC model signals conversions on ALERT_PIN, only the
+    # airquality5.measure_rdy case listens to it
+    s = sim.Simulation(alert_pin=sim.ALERT_PIN)
+    s.install()
+    try:
+        results = {}
+        for case in _cases():
+            results[case[0]] = measure(s, case[1], iterations, *case[2:])
+        return results
+    finally:
+        s.uninstall()
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    List of (case, metric, baseline value, new value) for the metrics worse
+    than the baseline by more than their tolerance. Cases missing from
+    either side are ignored.
+    """
+    worse = []
+    for name in sorted(results):
+        ref = baseline.get(name)
+        if ref is None:
+            continue
+        for metric in sorted(tolerance):
+            old = ref.get(metric)
+            new = results[name].get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * tolerance[metric] + 1e-9:
+                worse.append((name, metric, old, new))
+    return worse
+
+
+def _main(argv):
+    p = argparse.ArgumentParser(prog="python -m sim.bench", description="Driver and telemetry benchmarks")
+    p.add_argument("--iterations", type=int, default=200)
+    p.add_argument("--save", metavar="FILE", help="store the results as a baseline")
+    p.add_argument("--baseline", metavar="FILE", nargs="?", const=BASELINE,
+                   help="compare against a baseline (default %s)" % os.path.relpath(BASELINE, _ROOT))
+    args = p.parse_args(argv)
+
+    results = run(args.iterations)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        worse = compare(results, baseline)
+        for name, metric, old, new in worse:
+            print("REGRESSION %s %s: %s -> %s" % (name, metric, old, new), file=sys.stderr)
+        if worse:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,140 @@
+# Simulated I2C and SPI buses.
+#
+# The i2c.I2C and spi.Spi classes below replace the Zerynth ones. Each
+# transfer is forwarded to the register model attached to the bus and
+# charges its duration in virtual time: 9 clocks per byte on I2C (8 on SPI)
+# plus a fixed per-transaction overhead for the driver and bus turnaround.
+
+from sim import kernel as _kernel
+
+class Bus:
+    """ Statistics and attached device models of one bus peripheral. """
+    def __init__(self, sim, name, overhead_us):
+        self.sim = sim
+        self.name = name
+        self.overhead_us = overhead_us
+        self.devices = {}
+        self.mutex = _kernel.Lock(sim.kernel)
+        self.transactions = 0
+        self.bytes = 0
+        self.busy = 0.0
+
+    def attach(self, address, model):
+        """ Attach a device model at `address` (I2C address or SPI chip-select pin). """
+        self.devices[address] = model
+
+    def device(self, address):
+        if address not in self.devices:
+            raise IOError("no device at %s on %s" % (address, self.name))
+        return self.devices[address]
+
+    def charge(self, clocks, clock_hz, transaction):
+        """ Account a transfer of `clocks` bus clocks and let it take place in virtual time. """
+        t = clocks * 1000.0 / clock_hz
+        if transaction:
+            self.transactions += 1
+            t += self.overhead_us / 1000.0
+        self.busy += t
+        self.sim.kernel.sleep(t)
+
+    def stats(self, elapsed):
+        occupancy = 0.0
+        if elapsed > 0:
+            occupancy = self.busy / elapsed
+        return {
+            "transactions": self.transactions,
+            "bytes": self.bytes,
+            "busy_ms": self.busy,
+            "occupancy": occupancy,
+        }
+
+
+def _as_bytes(data):
+    if type(data) == int:
+        return bytes([data & 0xFF])
+    return bytes(data)
+
+
+class I2C:
+    """ Stand-in for Zerynth ``i2c.I2C``. """
+    sim = None
+
+    def __init__(self, drvname, addr, clock=100000):
+        self._bus = self.sim.bus(drvname)
+        self._addr = addr
+        self._clock = clock
+
+    def start(self):
+        self._bus.device(self._addr)
+
+    def stop(self):
+        pass
+
+    def lock(self):
+        self._bus.mutex.acquire()
+
+    def unlock(self):
+        self._bus.mutex.release()
+
+    def set_addr(self, addr):
+        self._addr = addr
+
+    def write(self, data, timeout=None):
+        data = _as_bytes(data)
+        self._bus.device(self._addr).i2c_write(data)
+        self._bus.bytes += len(data)
+        self._bus.charge(9 * (len(data) + 1) + 2, self._clock, True)
+
+    def read(self, n, timeout=None):
+        res = self._bus.device(self._addr).i2c_read(n)
+        self._bus.bytes += n
+        self._bus.charge(9 * (n + 1) + 2, self._clock, True)
+        return res
+
+    def write_read(self, data, n, timeout=None):
+        data = _as_bytes(data)
+        dev = self._bus.device(self._addr)
+        dev.i2c_write(data)
+        res = dev.i2c_read(n)
+        self._bus.bytes += len(data) + n
+        # repeated start: two address bytes
+        self._bus.charge(9 * (len(data) + n + 2) + 3, self._clock, True)
+        return res
+
+
+class Spi:
+    """ Stand-in for Zerynth ``spi.Spi``. """
+    sim = None
+
+    def __init__(self, pin_cs, drvname, clock=1000000):
+        self._bus = self.sim.bus(drvname)
+        self._cs = pin_cs
+        self._clock = clock
+
+    def select(self):
+        self._bus.mutex.acquire()
+        self._bus.device(self._cs).spi_select()
+        self._bus.charge(0, self._clock, True)
+
+    def unselect(self):
+        self._bus.device(self._cs).spi_unselect()
+        self._bus.mutex.release()
+
+    def write(self, data):
+        data = _as_bytes(data)
+        self._bus.device(self._cs).spi_write(data)
+        self._bus.bytes += len(data)
+        self._bus.charge(8 * len(data), self._clock, False)
+
+    def read(self, n, dummy=0):
+        res = self._bus.device(self._cs).spi_read(n)
+        self._bus.bytes += n
+        self._bus.charge(8 * n, self._clock, False)
+        return res
+
+    def exchange(self, data):
+        data = _as_bytes(data)
+        res = self._bus.device(self._cs).spi_read(len(data))
+        self._bus.bytes += len(data)
+        self._bus.charge(8 * len(data), self._clock, False)
+        return res
@@ -0,0 +1,191 @@
+# Checks of the air sensor readings on the simulated board:
+#
+#     python -m sim.check_airsensor
+#
+# latency  the getters are polled every millisecond while the reader task
+#          measures, first on the normal I2C bus, then with a slow one
+#          (SLOW_OVERHEAD_US per transaction). Measurements get much longer,
+#          the time spent in each getter must not grow. Both with the ADC
+#          ready output polled (the default) and wired to a pin.
+# watch    in watch mode, a constant input keeps the task asleep (no alarm,
+#          only the periodic refresh), while a step on the watched channel
+#          wakes it up. Both with the ADC ready output polled and wired.
+# ppm      get_all_ppm() is compared with the get_ppm() reference on the
+#          whole ratio range the AirQuality5 readings can produce.
+#
+# Exits with status 1 if a check fails.
+
+import math
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SLOW_OVERHEAD_US = 5000  # per I2C transaction, against the normal 60
+LATENCY_MAX = 1.0  # ms, virtual time spent in one round of getters
+PPM_ERROR_MAX = 1e-12  # relative difference from get_ppm()
+
+def latency(s, airsensor, ms):
+    """
+    Run the reader task for `ms` on simulation `s`, polling the getters.
+    Returns (measurements, longest measurement, longest getter round), in
+    ms of virtual time.
+    """
+    k = s.kernel
+    update = airsensor._update
+    res = [0, 0.0, 0.0]
+
+    def timed_update(snap):
+        t = k.now
+        snap = update(snap)
+        res[0] += 1
+        if k.now - t > res[1]:
+            res[1] = k.now - t
+        return snap
+
+    stop = [False]
+
+    def poll(name):
+        while not stop[0]:
+            t = k.now
+            airsensor.get_resistance(airsensor.GAS_CO)
+            airsensor.get_temp_hum_press()
+            airsensor.get_all_ppm()
+            airsensor.get_interval()
+            if k.now - t > res[2]:
+                res[2] = k.now - t
+            sleep(1)
+
+    airsensor._update = timed_update
+    try:
+        thread(poll, "poll")
+        s.run(ms)
+        stop[0] = True
+        s.run(10)
+    finally:
+        airsensor._update = update
+    return tuple(res)
+
+WATCH_MS = 130000  # two refreshes at _AIR_WATCH_MAX
+STEP_AT = 20000  # ms, when the watched input steps up in the second run
+
+def watch(pin, step):
+    """
+    Run the task in watch mode for WATCH_MS with the ADC ready output on
+    `pin` (None = polled). With `step` the watched CO input rises by 25%
+    at STEP_AT. Returns (wakeups, alarms, I2C transactions).
+    """
+    import sim
+    s = sim.Simulation(alert_pin=pin)
+    if step:
+        inputs = s.ads1015.inputs
+
+        def stepped(mux, t):
+            v = inputs(mux, t)
+            if mux == 6 and t >= STEP_AT:
+                v *= 1.25
+            return v
+        s.ads1015.inputs = stepped
+    s.install()
+    s.configure()
+    import airsensor
+    airsensor.set_lowpower(False)
+    airsensor.set_watch(True)
+    airsensor.start()
+    s.run(WATCH_MS)
+    res = airsensor.get_watch_stats() + (s.bus("I2C0").transactions,)
+    s.uninstall()
+    return res
+
+def ratios(steps=2000):
+    """
+    Snapshot ratios (NH3, CO, NO2) for AirQuality5 inputs from one averaged
+    ADC step (1/32 mV) to full scale, log-spaced, as measure() computes them.
+    """
+    import airsensor
+    from mikroe import airquality5 as aq
+    res = []
+    lo = math.log(1.0 / 32)
+    hi = math.log(3300.0)
+    for i in range(steps + 1):
+        v = math.exp(lo + (hi - lo) * i / steps)
+        res.append((aq._PULLUP_NH3 * v / (3301 - v) / airsensor._RES0_NH3,
+                    aq._PULLUP_CO * v / (3301 - v) / airsensor._RES0_CO,
+                    aq._PULLUP_NO2 * v / (3301 - v) / airsensor._RES0_NO2))
+    return res
+
+def ppm_error(airsensor, rs):
+    """ Largest relative difference of get_all_ppm() from get_ppm() on ratios `rs`. """
+    saved = airsensor._snap
+    err = 0.0
+    try:
+        for r in rs:
+            airsensor._snap = (r[0], r[1], r[2], 0, 0, 0, 0)
+            fast = airsensor.get_all_ppm()
+            for i in range(len(fast)):
+                ref = airsensor.get_ppm(airsensor.GAS_CO + i)
+                e = abs(fast[i] - ref) / ref
+                if e > err:
+                    err = e
+        # no concentrations from a zero reading (log of 0)
+        airsensor._snap = (0.0, 1.0, 1.0, 0, 0, 0, 0)
+        if airsensor.get_all_ppm() is not None:
+            err = float("inf")
+    finally:
+        airsensor._snap = saved
+    return err
+
+def _main():
+    import sim
+    if _ROOT not in sys.path:
+        sys.path.insert(0, _ROOT)
+    failed = 0
+    for mode, pin in (("polled", None), ("ready pin", sim.ALERT_PIN)):
+        s = sim.Simulation(alert_pin=pin)
+        s.install()
+        s.configure()
+        import airsensor
+        airsensor.set_lowpower(False)
+        airsensor.start()
+        bus = s.bus("I2C0")
+        normal = latency(s, airsensor, 10000)
+        bus.overhead_us = SLOW_OVERHEAD_US
+        slow = latency(s, airsensor, 10000)
+        for name, r in (("normal bus", normal), ("slow bus", slow)):
+            ok = r[0] > 0 and r[2] <= LATENCY_MAX
+            if not ok:
+                failed += 1
+            print("latency  %s %-9s %-10s %3d measurements up to %7.1f ms, getters up to %.1f ms" %
+                  (("ok  " if ok else "FAIL"), mode, name, r[0], r[1], r[2]))
+        s.uninstall()
+
+    for mode, pin in (("polled", None), ("ready pin", sim.ALERT_PIN)):
+        r = watch(pin, False)
+        # one timeout per _AIR_WATCH_MAX, no alarms
+        ok = r[1] == 0 and r[0] <= WATCH_MS // 60000
+        if not ok:
+            failed += 1
+        print("watch    %s %-9s constant   %3d wakeups, %3d alarms, %5d I2C transactions" %
+              (("ok  " if ok else "FAIL"), mode, r[0], r[1], r[2]))
+        r = watch(pin, True)
+        ok = r[1] >= 1
+        if not ok:
+            failed += 1
+        print("watch    %s %-9s step       %3d wakeups, %3d alarms, %5d I2C transactions" %
+              (("ok  " if ok else "FAIL"), mode, r[0], r[1], r[2]))
+
+    s = sim.Simulation()
+    s.install()
+    import airsensor
+
+    rs = ratios()
+    err = ppm_error(airsensor, rs)
+    ok = err <= PPM_ERROR_MAX
+    if not ok:
+        failed += 1
+    print("ppm      %s %d readings, max relative error %.2g" % (("ok  " if ok else "FAIL"), len(rs), err))
+    s.uninstall()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,123 @@
+# Round-trip checks of the telemetry encodings:
+#
+#     python -m sim.check_codec [count]
+#
+# Records with every field of codec.FIELDS, with random subsets of them and
+# with extreme values are encoded with codec.Encoder and decoded back, one at
+# a time and in pack_binary() batches. Numbers must come back rounded to
+# their decimals, strings unchanged. The same records go through to_json(),
+# which must be valid JSON with the same values. Exits with status 1 on a
+# mismatch.
+
+import json
+import os
+import random
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# largest magnitude of a random number, per number of decimals (scaled
+# values within 32 bits)
+_RANGE = (2000000000, 200000000, 20000000, 2000000, 200000, 20000, 2000)
+
+def _value(rnd, n, extreme=False):
+    if n < 0:
+        k = rnd.randint(0, 40)
+        if extreme:
+            k = 200
+        return "".join(rnd.choice("abcXYZ019 _-è") for i in range(k))
+    top = _RANGE[n]
+    if extreme:
+        v = rnd.choice((top, -top, 0))
+    else:
+        v = rnd.uniform(-top, top) / rnd.choice((1, 10, 1000, 100000))
+    if n == 0:
+        return int(v)
+    return v
+
+def records(count, seed=1):
+    """ `count` random records: full, random subsets and extreme values. """
+    import codec
+    rnd = random.Random(seed)
+    res = []
+    for i in range(count):
+        kind = i % 3
+        values = {}
+        for name, n in codec.FIELDS:
+            if kind == 1 and rnd.random() < 0.7:
+                continue
+            values[name] = _value(rnd, n, kind == 2)
+        ts = rnd.randint(0, 4000000000)
+        res.append((ts, values))
+    return res
+
+def _same(name, n, sent, got):
+    if n < 0:
+        return sent == got
+    if n == 0:
+        return got == int(sent)
+    # half a unit of the last decimal, plus the float rounding
+    return abs(got - sent) <= 0.5 / 10 ** n + abs(sent) * 1e-12
+
+def check(recs):
+    """ Returns a list of mismatch descriptions. """
+    import codec
+    bad = []
+    enc = codec.Encoder()
+    blobs = []
+    for ts, values in recs:
+        blob = enc.encode(ts, values)
+        blobs.append(blob)
+        t, got, pos = codec.decode(blob)
+        if t != ts or pos != len(blob):
+            bad.append("binary ts/length: %d/%d, expected %d/%d" % (t, pos, ts, len(blob)))
+        bad += _compare("binary", values, got)
+        doc = json.loads(codec.to_json(ts, values))
+        if doc["ts"] != ts * 1000:
+            bad.append("json ts: %d, expected %d" % (doc["ts"], ts * 1000))
+        got = {}
+        for name in doc["values"]:
+            v = doc["values"][name]
+            if codec._DECIMALS[name] > 0:
+                v = float(v)
+            got[name] = v
+        bad += _compare("json", values, got)
+    # batches of up to 6 records, as queued by main.py
+    for i in range(0, len(recs), 6):
+        dec = codec.decode_batch(codec.pack_binary(blobs[i:i + 6]))
+        if len(dec) != len(recs[i:i + 6]):
+            bad.append("batch at %d: %d records, expected %d" % (i, len(dec), len(recs[i:i + 6])))
+            continue
+        for k in range(len(dec)):
+            if dec[k][0] != recs[i + k][0]:
+                bad.append("batch at %d: ts %d, expected %d" % (i, dec[k][0], recs[i + k][0]))
+            bad += _compare("batch", recs[i + k][1], dec[k][1])
+    return bad
+
+def _compare(what, values, got):
+    import codec
+    bad = []
+    if sorted(got) != sorted(values):
+        bad.append("%s fields: %s, expected %s" % (what, sorted(got), sorted(values)))
+        return bad
+    for name in values:
+        n = codec._DECIMALS[name]
+        if not _same(name, n, values[name], got[name]):
+            bad.append("%s %s: %r, expected %r" % (what, name, got[name], values[name]))
+    return bad
+
+def _main(argv):
+    if _ROOT not in sys.path:
+        sys.path.insert(0, _ROOT)
+    count = 3000
+    if len(argv) > 1:
+        count = int(argv[1])
+    recs = records(count)
+    bad = check(recs)
+    print("%d records, %d mismatches" % (len(recs), len(bad)))
+    for line in bad[:20]:
+        print("    " + line)
+    return 1 if bad else 0
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv))
@@ -0,0 +1,103 @@
+# Checks of the timestamp conversions against the host calendar:
+#
+#     python -m sim.check_timestamp [count]
+#
+# to_unix, from_unix and to_unix_batch are compared with calendar.timegm and
+# time.gmtime on `count` random instants between years 1 and 9999, on every
+# hour of 1960..2100 and on the last and first seconds of the days around
+# leap days and century boundaries. Instants are converted both in random
+# and in time order, so the cached day of to_unix is missed and hit.
+# Exits with status 1 on a mismatch.
+
+import calendar
+import os
+import random
+import sys
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_FIRST = calendar.timegm((1, 1, 1, 0, 0, 0, 0, 0, 0))
+_LAST = calendar.timegm((9999, 12, 31, 23, 59, 59, 0, 0, 0))
+
+# years where the leap rules change or wrap around
+_EDGE_YEARS = (1, 4, 99, 100, 101, 399, 400, 401, 1600, 1700, 1800, 1899, 1900, 1901,
+               1969, 1970, 1971, 1999, 2000, 2001, 2004, 2038, 2099, 2100, 2400, 9996, 9999)
+
+def random_instants(count, seed=1):
+    """ `count` random Unix times between years 1 and 9999. """
+    rnd = random.Random(seed)
+    return [rnd.randint(_FIRST, _LAST) for i in range(count)]
+
+def hourly_instants(first=1960, last=2100):
+    """ Every hour from January 1 of `first` to the end of `last`. """
+    t0 = calendar.timegm((first, 1, 1, 0, 0, 0, 0, 0, 0))
+    t1 = calendar.timegm((last + 1, 1, 1, 0, 0, 0, 0, 0, 0))
+    return list(range(t0, t1, 3600))
+
+def edge_instants():
+    """ First and last second of the days around leap days and year ends. """
+    res = []
+    for y in _EDGE_YEARS:
+        for md in ((1, 1), (2, 28), (3, 1), (12, 31)):
+            t = calendar.timegm((y, md[0], md[1], 0, 0, 0, 0, 0, 0))
+            for d in (-86400, 0, 86400):
+                for s in (-1, 0, 86399):
+                    u = t + d + s
+                    if _FIRST <= u <= _LAST:
+                        res.append(u)
+    return res
+
+def check(timestamp, instants):
+    """
+    Convert every instant in `instants` (Unix times) both ways, one at a time
+    and with to_unix_batch. Returns a list of mismatch descriptions.
+    """
+    bad = []
+    tss = []
+    for t in instants:
+        ts = time.gmtime(t)[:6]
+        tss.append(ts)
+        got = timestamp.from_unix(t)
+        if tuple(got) != ts:
+            bad.append("from_unix(%d) = %s, expected %s" % (t, got, ts))
+        got = timestamp.to_unix(ts)
+        if got != t:
+            bad.append("to_unix(%s) = %d, expected %d" % (ts, got, t))
+    res = timestamp.to_unix_batch(tss)
+    for i in range(len(instants)):
+        if res[i] != instants[i]:
+            bad.append("to_unix_batch[%d] (%s) = %d, expected %d" % (i, tss[i], res[i], instants[i]))
+    return bad
+
+def _main(argv):
+    if _ROOT not in sys.path:
+        sys.path.insert(0, _ROOT)
+    import timestamp
+    count = 200000
+    if len(argv) > 1:
+        count = int(argv[1])
+
+    rnd = random_instants(count)
+    hourly = hourly_instants()
+    # every second of a day crossing midnight: the cached day is reused
+    day = list(range(calendar.timegm((2019, 6, 15, 12, 0, 0, 0, 0, 0)), calendar.timegm((2019, 6, 16, 12, 0, 0, 0, 0, 0))))
+    suites = (
+        ("random", rnd),
+        ("sorted", sorted(rnd)),
+        ("hourly", hourly),
+        ("one day", day),
+        ("edges", edge_instants()),
+    )
+    failed = 0
+    for name, instants in suites:
+        bad = check(timestamp, instants)
+        print("%-9s %s %d instants, %d mismatches" % (name, ("ok  " if not bad else "FAIL"), len(instants), len(bad)))
+        for line in bad[:10]:
+            print("    " + line)
+        if bad:
+            failed += 1
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv))
@@ -0,0 +1,487 @@
+# Register-level models of the sensors used by the demo.
+#
+# Models produce data from signal functions of virtual time, so the drivers
+# see conversions appear at the configured data rate, stale data when they
+# read too early, FIFO overruns when they are late, and interrupt edges on
+# the pins they are wired to.
+
+import math
+import struct
+
+# --- LIS2HH12 accelerometer (SPI) ---
+
+_LIS_ODR = (0, 10, 50, 100, 200, 400, 800, 0)
+_LIS_SO = (0.061, 0.061, 0.122, 0.244)  # mg/digit for FS bits 00, 01, 10, 11
+_LIS_FIFO_DEPTH = 32
+
+def still(t):
+    """ Acceleration signal of a device lying flat (g). """
+    return (0.0, 0.0, 1.0)
+
+def riding(t):
+    """ Acceleration signal of a bike on a rough road (g). """
+    s = t / 1000.0
+    return (0.05 * math.sin(2 * math.pi * 1.3 * s),
+            0.08 * math.sin(2 * math.pi * 7.0 * s + 1.0),
+            1.0 + 0.3 * math.sin(2 * math.pi * 11.0 * s) * math.sin(2 * math.pi * 0.5 * s))
+
+def pothole(t, at=20000):
+    """ Riding, with a 3 g jolt lasting 40 ms at time `at` (ms). """
+    a = riding(t)
+    if at <= t < at + 40:
+        return (a[0], a[1], 3.0)
+    return a
+
+def crash(t, at=20000):
+    """ Riding, then 300 ms of free fall from time `at` (ms) and an impact. """
+    if t < at:
+        return riding(t)
+    if t < at + 300:
+        return (0.02, -0.01, 0.05)
+    if t < at + 350:
+        return (1.5, 0.8, 2.5)
+    # lying on its side
+    return (0.0, 1.0, 0.0)
+
+class LIS2HH12Model:
+    """
+    LIS2HH12 register file with ODR-paced samples, FIFO (bypass, FIFO and
+    stream modes) and INT1 data-ready / FIFO threshold edges on `int1_pin`.
+    `signal(t)` returns the acceleration in g at virtual time `t` (ms).
+    """
+    def __init__(self, sim, signal=still, int1_pin=None, temperature=28.0):
+        self.sim = sim
+        self.signal = signal
+        self.int1_pin = int1_pin
+        self.temperature = temperature
+        self.samples = 0
+        self.overruns = 0
+        self.int_edges = 0
+        self._reset()
+
+    def _reset(self):
+        self.regs = bytearray(0x40)
+        self.regs[0x0F] = 0x41
+        self.regs[0x20] = 0x07
+        self.regs[0x23] = 0x04
+        t = int((self.temperature - 25.0) * 256)
+        self.regs[0x0B] = t & 0xFF
+        self.regs[0x0C] = (t >> 8) & 0xFF
+        self._fifo = []
+        self._ovr = False
+        self._start = self.sim.kernel.now
+        self._produced = 0
+        self._last = (0, 0, 0)
+        self._addr = 0
+        self._first = True
+        self._reading = False
+        self._timer = False
+
+    def _odr(self):
+        return _LIS_ODR[(self.regs[0x20] >> 4) & 0x07]
+
+    def _fifo_mode(self):
+        if not self.regs[0x22] & 0x80:
+            return 0
+        return (self.regs[0x2E] >> 5) & 0x07
+
+    def _counts(self, g):
+        so = _LIS_SO[(self.regs[0x23] >> 4) & 0x03]
+        c = int(round(g * 1000.0 / so))
+        if c > 32767:
+            c = 32767
+        if c < -32768:
+            c = -32768
+        return c
+
+    def _produce(self, t):
+        a = self.signal(t)
+        s = (self._counts(a[0]), self._counts(a[1]), self._counts(a[2]))
+        self._last = s
+        self.samples += 1
+        mode = self._fifo_mode()
+        if mode == 0:
+            return
+        if len(self._fifo) < _LIS_FIFO_DEPTH:
+            self._fifo.append(s)
+        elif mode == 0b001:
+            # FIFO mode stops collecting when full
+            self._ovr = True
+        else:
+            self._fifo.pop(0)
+            self._fifo.append(s)
+            self._ovr = True
+            self.overruns += 1
+
+    def _catch_up(self):
+        odr = self._odr()
+        if odr == 0:
+            return
+        period = 1000.0 / odr
+        # the epsilon keeps a sample due exactly now from rounding down
+        n = int((self.sim.kernel.now - self._start) / period + 1e-6)
+        while self._produced < n:
+            self._produced += 1
+            self._produce(self._start + self._produced * period)
+
+    def _restart(self):
+        self._catch_up()
+        self._start = self.sim.kernel.now
+        self._produced = 0
+        self._arm_timer()
+
+    def _arm_timer(self):
+        # schedule the next sample for interrupt generation
+        if self._timer or self.int1_pin is None or not (self.regs[0x22] & 0x03):
+            return
+        odr = self._odr()
+        if odr == 0:
+            return
+        period = 1000.0 / odr
+        self._timer = True
+        self.sim.kernel.call_at(self._start + (self._produced + 1) * period, self._tick)
+
+    def _tick(self):
+        self._timer = False
+        before = len(self._fifo)
+        self._catch_up()
+        ctrl3 = self.regs[0x22]
+        wtm = self.regs[0x2E] & 0x1F
+        if ctrl3 & 0x01:
+            self._edge()
+        elif ctrl3 & 0x02 and before < wtm <= len(self._fifo):
+            self._edge()
+        self._arm_timer()
+
+    def _edge(self):
+        self.int_edges += 1
+        self.sim.pins.fire(self.int1_pin, True)
+
+    def _fifo_src(self):
+        # FTH | OVR | EMPTY | FSS[4:0]: FSS wraps to 0 when the FIFO is full
+        n = len(self._fifo)
+        v = n & 0x1F
+        if n >= (self.regs[0x2E] & 0x1F):
+            v |= 0x80
+        if self._ovr or n >= _LIS_FIFO_DEPTH:
+            v |= 0x40
+        if n == 0:
+            v |= 0x20
+        return v
+
+    def _out(self):
+        if self._fifo_mode() != 0 and self._fifo:
+            return self._fifo[0]
+        return self._last
+
+    def _read_reg(self, a):
+        if a == 0x2F:
+            return self._fifo_src()
+        if 0x28 <= a <= 0x2D:
+            s = self._out()[(a - 0x28) >> 1]
+            if a & 1:
+                return (s >> 8) & 0xFF
+            return s & 0xFF
+        return self.regs[a]
+
+    def _write_reg(self, a, v):
+        self.regs[a] = v
+        if a == 0x24 and v & 0x40:
+            self._reset()
+        elif a == 0x20:
+            self._restart()
+        elif a == 0x2E:
+            if (v >> 5) == 0:
+                self._fifo = []
+                self._ovr = False
+        elif a == 0x22:
+            self._arm_timer()
+
+    def spi_select(self):
+        self._catch_up()
+        self._first = True
+
+    def spi_unselect(self):
+        pass
+
+    def _next(self):
+        a = self._addr
+        if self._fifo_mode() != 0 and a == 0x2D:
+            # FIFO read: pop the sample and roll back to OUT_X_L
+            if self._fifo:
+                self._fifo.pop(0)
+                if not self._fifo:
+                    self._ovr = False
+            self._addr = 0x28
+        elif self.regs[0x23] & 0x04:
+            self._addr = (a + 1) & 0x3F
+
+    def spi_write(self, data):
+        i = 0
+        if self._first:
+            self._first = False
+            self._reading = bool(data[0] & 0x80)
+            self._addr = data[0] & 0x3F
+            i = 1
+        while i < len(data):
+            self._write_reg(self._addr, data[i])
+            self._next()
+            i += 1
+
+    def spi_read(self, n):
+        res = bytearray(n)
+        for i in range(n):
+            res[i] = self._read_reg(self._addr)
+            self._next()
+        return bytes(res)
+
+
+# --- ADS1015 ADC (I2C) ---
+
+_ADS_RATES = (128, 250, 490, 920, 1600, 2400, 3300, 3300)
+_ADS_FSR = (6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256)
+_ADS_QUEUE = (1, 2, 4)
+
+def _constant_inputs(v):
+    def f(mux, t):
+        return v[mux]
+    return f
+
+class ADS1015Model:
+    """
+    ADS1015 with single-shot and continuous conversions paced to the data
+    rate, comparator (traditional / window, latching, queue) and ALERT/RDY
+    conversion-ready pulses on `alert_pin` (active low edges).
+    `inputs(mux, t)` returns the input voltage for MUX setting `mux` (0..7).
+    """
+    def __init__(self, sim, inputs=None, alert_pin=None):
+        self.sim = sim
+        if inputs is None:
+            inputs = _constant_inputs((0.0, 0.0, 0.0, 0.0, 1.2, 0.8, 1.5, 0.0))
+        self.inputs = inputs
+        self.alert_pin = alert_pin
+        self.conversions = 0
+        self.alerts = 0
+        self.regs = [0, 0x8583, 0x8000, 0x7FFF]
+        self._ptr = 0
+        self._start = 0.0
+        self._done = 0
+        self._oneshot_end = None
+        self._asserted = False
+        self._outside = 0
+        self._timer = False
+
+    def _period(self):
+        return 1000.0 / _ADS_RATES[(self.regs[1] >> 5) & 0x07]
+
+    def _continuous(self):
+        return not self.regs[1] & 0x0100
+
+    def _convert(self, t):
+        conf = self.regs[1]
+        v = self.inputs((conf >> 12) & 0x07, t)
+        code = int(round(v / _ADS_FSR[(conf >> 9) & 0x07] * 2048))
+        if code > 2047:
+            code = 2047
+        if code < -2048:
+            code = -2048
+        self.regs[0] = (code << 4) & 0xFFFF
+        self.conversions += 1
+        self._compare(code)
+
+    def _compare(self, code):
+        conf = self.regs[1]
+        cque = conf & 0x03
+        if cque == 3 or self.alert_pin is None:
+            return
+        hi = self.regs[3]
+        lo = self.regs[2]
+        if hi & 0x8000 and not lo & 0x8000:
+            # conversion-ready mode
+            self._pulse()
+            return
+        hi = _signed12(hi)
+        lo = _signed12(lo)
+        if conf & 0x10:
+            out = code > hi or code < lo
+        else:
+            out = code > hi
+        if out:
+            self._outside += 1
+            if not self._asserted and self._outside >= _ADS_QUEUE[cque]:
+                self._asserted = True
+                self._pulse()
+        else:
+            self._outside = 0
+            if not conf & 0x04 and (conf & 0x10 or code < lo):
+                self._asserted = False
+
+    def _pulse(self):
+        self.alerts += 1
+        self.sim.pins.fire(self.alert_pin, False)
+
+    def _catch_up(self):
+        now = self.sim.kernel.now
+        if self._oneshot_end is not None:
+            if now >= self._oneshot_end:
+                self._convert(self._oneshot_end)
+                self._oneshot_end = None
+                self.regs[1] |= 0x8000
+            return
+        if not self._continuous():
+            return
+        period = self._period()
+        n = int((now - self._start) / period + 1e-6)
+        while self._done < n:
+            self._done += 1
+            self._convert(self._start + self._done * period)
+
+    def _arm_timer(self):
+        if self._timer or self.alert_pin is None or (self.regs[1] & 0x03) == 3:
+            return
+        if self._continuous():
+            t = self._start + (self._done + 1) * self._period()
+        elif self._oneshot_end is not None:
+            t = self._oneshot_end
+        else:
+            return
+        self._timer = True
+        self.sim.kernel.call_at(t, self._tick)
+
+    def _tick(self):
+        self._timer = False
+        self._catch_up()
+        self._arm_timer()
+
+    def _write_conf(self, v):
+        self._catch_up()
+        self.regs[1] = v & 0x7FFF
+        self._outside = 0
+        now = self.sim.kernel.now
+        if v & 0x0100:
+            if v & 0x8000:
+                self._oneshot_end = now + self._period()
+            else:
+                self.regs[1] |= 0x8000
+        else:
+            self._start = now
+            self._done = 0
+        self._arm_timer()
+
+    def i2c_write(self, data):
+        self._catch_up()
+        self._ptr = data[0] & 0x03
+        if len(data) >= 3:
+            v = (data[1] << 8) | data[2]
+            if self._ptr == 1:
+                self._write_conf(v)
+            else:
+                self.regs[self._ptr] = v
+
+    def i2c_read(self, n):
+        self._catch_up()
+        v = self.regs[self._ptr]
+        if self._ptr == 0 and self.regs[1] & 0x04:
+            # reading the conversion clears a latched alert
+            self._asserted = False
+        res = bytearray(n)
+        for i in range(n):
+            res[i] = (v >> (8 * (1 - (i & 1)))) & 0xFF
+        return bytes(res)
+
+def _signed12(v):
+    v = (v >> 4) & 0xFFF
+    if v & 0x800:
+        v -= 0x1000
+    return v
+
+
+# --- BME680 environmental sensor (I2C) ---
+
+# calibration coefficients in the order unpacked by the driver
+_BME_COEFF = (26403, 3, 0, 36477, -10685, 88, 0, 7621, -99, 44, 30, 0, -3689, -4164,
+              30, 0, 63, 12427, 0, 45, 20, 120, -100, 25797, -5969, -30, 18)
+_BME_COEFF_FMT = '<hbBHhbBhhbbHhhBBBHbbbBbHhbb'
+
+def indoor(t):
+    """ Raw BME680 ADC values: (pressure, temperature, humidity, gas, gas range). """
+    return (333000, 499000, 22000, 520, 5)
+
+class BME680Model:
+    """
+    BME680 with calibration data, forced-mode measurements lasting the time
+    given by the oversampling and heater settings, and the new-data flag.
+    `signal(t)` returns the raw ADC values (see `indoor`).
+    """
+    def __init__(self, sim, signal=indoor):
+        self.sim = sim
+        self.signal = signal
+        self.measurements = 0
+        self.regs = bytearray(256)
+        packed = struct.pack(_BME_COEFF_FMT, *_BME_COEFF)
+        self.regs[0x8A:0x8A + 24] = packed[0:24]
+        self.regs[0xE1:0xE1 + 14] = packed[24:38]
+        self.regs[0x00] = 0x2D
+        self.regs[0x02] = 0x10
+        self.regs[0x04] = 0x10
+        self._reset()
+
+    def _reset(self):
+        for a in range(0x1D, 0x76):
+            self.regs[a] = 0
+        self.regs[0xD0] = 0x61
+        self._ptr = 0
+        self._end = None
+
+    def duration(self):
+        """ Measurement time (ms) with the current settings (BME68x API model). """
+        rates = (0, 1, 2, 4, 8, 16, 16, 16)
+        meas = self.regs[0x74]
+        cycles = rates[(meas >> 5) & 7] + rates[(meas >> 2) & 7] + rates[self.regs[0x72] & 7]
+        us = cycles * 1963 + 477 * 4 + 477 * 5 + 1000
+        t = us / 1000.0
+        if self.regs[0x71] & 0x10:
+            w = self.regs[0x5A]
+            t += (w & 0x3F) * (1 << (2 * (w >> 6)))
+        return t
+
+    def _catch_up(self):
+        if self._end is not None and self.sim.kernel.now >= self._end:
+            p, t, h, g, r = self.signal(self._end)
+            self.regs[0x1D] = 0x80
+            self.regs[0x1F] = (p >> 12) & 0xFF
+            self.regs[0x20] = (p >> 4) & 0xFF
+            self.regs[0x21] = (p << 4) & 0xF0
+            self.regs[0x22] = (t >> 12) & 0xFF
+            self.regs[0x23] = (t >> 4) & 0xFF
+            self.regs[0x24] = (t << 4) & 0xF0
+            self.regs[0x25] = (h >> 8) & 0xFF
+            self.regs[0x26] = h & 0xFF
+            self.regs[0x2A] = (g >> 2) & 0xFF
+            self.regs[0x2B] = ((g << 6) & 0xC0) | 0x30 | (r & 0x0F)
+            self.regs[0x74] &= 0xFC
+            self._end = None
+            self.measurements += 1
+
+    def i2c_write(self, data):
+        self._catch_up()
+        if len(data) == 1:
+            self._ptr = data[0]
+            return
+        for i in range(0, len(data) - 1, 2):
+            a = data[i]
+            v = data[i + 1]
+            if a == 0xE0:
+                if v == 0xB6:
+                    self._reset()
+                continue
+            self.regs[a] = v
+            if a == 0x74 and v & 0x03 == 0x01:
+                self.regs[0x1D] = 0x20  # measuring
+                self._end = self.sim.kernel.now + self.duration()
+
+    def i2c_read(self, n):
+        self._catch_up()
+        res = bytes(self.regs[self._ptr:self._ptr + n])
+        self._ptr = (self._ptr + n) & 0xFF
+        return res
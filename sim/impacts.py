@@ -0,0 +1,103 @@
+# Replay of acceleration traces through the accel sampling path, checking
+# the impact/fall events it detects:
+#
+#     python -m sim.impacts
+#
+# Each trace is a list of (x, y, z) samples in g at the accel data rate,
+# recorded from the simulated signals or built from recorded shapes, with
+# the events expected from it. Exits with status 1 on a mismatch.
+
+import os
+import sys
+import math
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def record(signal, seconds, rate=100):
+    """ Samples of `signal(t)` (t in ms) over `seconds`, at `rate` Hz. """
+    n = int(seconds * rate)
+    return [signal(i * 1000.0 / rate) for i in range(n)]
+
+def _drop(height_m, rest=(0.0, 0.0, 1.0), rate=100):
+    # free fall from `height_m`, a 60 ms impact scaled on the fall speed, rest
+    t = math.sqrt(2 * height_m / 9.80665)
+    s = [(1.0, 0.0, 0.0)] * 200
+    s += [(0.03, 0.02, 0.04)] * int(t * rate)
+    g = 1.5 + 4.0 * height_m
+    s += [(g * 0.6, g * 0.3, g * 0.75)] * 6
+    s += [rest] * 300
+    return s
+
+def traces():
+    """ (name, samples, expected event names) of the replay suite. """
+    from sim import devices
+    return (
+        ("still", record(devices.still, 10), ()),
+        ("riding", record(devices.riding, 30), ()),
+        ("pothole", record(devices.pothole, 30), ("impact",)),
+        ("crash", record(devices.crash, 30), ("fall",)),
+        ("drop 1 m", _drop(1.0), ("fall",)),
+        ("drop 20 cm", _drop(0.2), ("fall",)),
+        # too short to be a free fall (jump off a kerb)
+        ("hop", _drop(0.01)[:200] + [(0.0, 0.0, 0.1)] * 4 + [(0.0, 0.0, 2.5)] * 4 + [(0.0, 0.0, 1.0)] * 100,
+         ("impact",)),
+        # the second one falls in the hold-off of the first
+        ("two bumps", record(_bumps((5000, 5500, 15000)), 20), ("impact", "impact")),
+    )
+
+def _bumps(times):
+    from sim import devices
+    def signal(t):
+        for at in times:
+            if at <= t < at + 40:
+                return devices.pothole(t, at)
+        return devices.riding(t)
+    return signal
+
+def replay(accel, samples, rate=100):
+    """ Feed `samples` (g) to the accel processing; returns the event names. """
+    k = 9.80665 / accel._accel.scale()
+    accel._impact = accel._detector()
+    accel._alarm = None
+    events = []
+    for i in range(len(samples)):
+        a = samples[i]
+        x = int(round(a[0] * k))
+        y = int(round(a[1] * k))
+        z = int(round(a[2] * k))
+        if accel._ACCEL_FIXED:
+            accel._process_fixed(_clip(x), _clip(y), _clip(z))
+        else:
+            accel._process(_clip(x) / k * 9.80665, _clip(y) / k * 9.80665, _clip(z) / k * 9.80665)
+        if accel._alarm is not None:
+            events.append(accel._alarm[0])
+            accel._alarm = None
+    return events
+
+def _clip(c):
+    # the sensor saturates at full scale
+    if c > 32767:
+        return 32767
+    if c < -32768:
+        return -32768
+    return c
+
+def _main():
+    import sim
+    if _ROOT not in sys.path:
+        sys.path.insert(0, _ROOT)
+    s = sim.Simulation()
+    s.install()
+    import accel
+    failed = 0
+    for name, samples, expected in traces():
+        got = tuple(replay(accel, samples))
+        ok = got == tuple(expected)
+        if not ok:
+            failed += 1
+        print("%-10s %s expected %s got %s" % (name, ("ok  " if ok else "FAIL"), list(expected), list(got)))
+    s.uninstall()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,200 @@
+# Virtual-time scheduler for the simulated Zerynth threads.
+#
+# Every simulated thread is a real CPython thread, but time only moves when
+# all of them are blocked (sleeping, waiting for a lock or an event, or busy
+# on a bus transfer). The clock then jumps to the earliest deadline or timer,
+# so a simulated minute runs as fast as the Python code allows and timings
+# do not depend on the host.
+
+import threading as _threading
+import heapq
+
+class _Waiter:
+    def __init__(self, pred, deadline):
+        self.pred = pred
+        self.deadline = deadline
+        self.ready = False
+
+class Kernel:
+    """
+    Virtual clock (`now`, in milliseconds) shared by all simulated threads.
+    The thread creating the kernel is registered as a simulated thread.
+    """
+    def __init__(self):
+        self._cv = _threading.Condition(_threading.RLock())
+        self.now = 0.0
+        self._runnable = 1
+        self._waiters = []
+        self._timers = []
+        self._seq = 0
+        self.threads = []
+        self.errors = []
+
+    # --- blocking primitives (called with or without the kernel lock) ---
+
+    def wait(self, pred=None, timeout=None):
+        """
+        Block the calling simulated thread until `pred()` is true or
+        `timeout` ms of virtual time have elapsed. Returns the final value
+        of `pred()` (False on timeout, True when only sleeping).
+        """
+        with self._cv:
+            deadline = None
+            if timeout is not None:
+                deadline = self.now + timeout
+            w = _Waiter(pred, deadline)
+            while True:
+                if pred is not None and pred():
+                    return True
+                if deadline is not None and self.now >= deadline:
+                    return pred is None
+                w.ready = False
+                self._waiters.append(w)
+                self._runnable -= 1
+                self._schedule()
+                while not w.ready:
+                    self._cv.wait()
+                self._waiters.remove(w)
+
+    def sleep(self, ms):
+        """ Let `ms` milliseconds of virtual time pass for the calling thread. """
+        if ms <= 0:
+            return
+        self.wait(None, ms)
+
+    def notify(self):
+        """ Re-check waiting threads after a state change (lock released, event set). """
+        with self._cv:
+            self._wake_ready()
+
+    def call_at(self, t, fn):
+        """ Run `fn()` when the clock reaches `t` (with the kernel lock held). """
+        with self._cv:
+            self._seq += 1
+            heapq.heappush(self._timers, (t, self._seq, fn))
+
+    # --- threads ---
+
+    def spawn(self, fn, args, name):
+        """ Start `fn(*args)` as a new simulated thread. """
+        with self._cv:
+            self._runnable += 1
+            self.threads.append(name)
+        t = _threading.Thread(target=self._body, args=(fn, args, name), name=name)
+        t.daemon = True
+        t.start()
+        return t
+
+    def _body(self, fn, args, name):
+        try:
+            fn(*args)
+        except BaseException as e:
+            self.errors.append((name, e))
+            print("sim: thread", name, "ended with", repr(e))
+        finally:
+            with self._cv:
+                self._runnable -= 1
+                self._schedule()
+
+    # --- scheduling (kernel lock held) ---
+
+    def _wake_ready(self):
+        woke = False
+        for w in self._waiters:
+            if w.ready:
+                continue
+            if (w.pred is not None and w.pred()) or (w.deadline is not None and self.now >= w.deadline):
+                w.ready = True
+                self._runnable += 1
+                woke = True
+        if woke:
+            self._cv.notify_all()
+
+    def _next_event(self):
+        t = None
+        for w in self._waiters:
+            if not w.ready and w.deadline is not None:
+                if t is None or w.deadline < t:
+                    t = w.deadline
+        if self._timers and (t is None or self._timers[0][0] < t):
+            t = self._timers[0][0]
+        return t
+
+    def _schedule(self):
+        self._wake_ready()
+        while self._runnable == 0:
+            t = self._next_event()
+            if t is None:
+                # every thread is blocked forever
+                return
+            if t > self.now:
+                self.now = t
+            while self._timers and self._timers[0][0] <= self.now:
+                fn = heapq.heappop(self._timers)[2]
+                fn()
+            self._wake_ready()
+
+
+class Lock:
+    """ Non-reentrant lock blocking in virtual time. """
+    def __init__(self, kernel):
+        self._k = kernel
+        self._held = False
+
+    def _free(self):
+        return not self._held
+
+    def acquire(self, blocking=True, timeout=-1):
+        with self._k._cv:
+            if not self._held:
+                self._held = True
+                return True
+            if not blocking:
+                return False
+            if timeout is None or timeout < 0:
+                timeout = None
+            if self._k.wait(self._free, timeout):
+                self._held = True
+                return True
+            return False
+
+    def release(self):
+        with self._k._cv:
+            self._held = False
+            self._k.notify()
+
+    def locked(self):
+        return self._held
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Event:
+    """ Event with Zerynth semantics: `wait(timeout)` in milliseconds. """
+    def __init__(self, kernel):
+        self._k = kernel
+        self._flag = False
+
+    def _is_set(self):
+        return self._flag
+
+    def set(self):
+        with self._k._cv:
+            self._flag = True
+            self._k.notify()
+
+    def clear(self):
+        self._flag = False
+
+    def is_set(self):
+        return self._flag
+
+    def wait(self, timeout=-1):
+        if timeout is None or timeout < 0:
+            timeout = None
+        return self._k.wait(self._is_set, timeout)
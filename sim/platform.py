@@ -0,0 +1,207 @@
+# Stand-ins for the Zerynth VM builtins and the Polaris board libraries.
+#
+# They are deliberately small: just enough behavior for accel.py,
+# airsensor.py and the main.py loop, with time-consuming operations (modem
+# commands, MQTT publishing) charged in virtual time.
+
+import math
+
+class Pins:
+    """ Pin interrupt registry used by onPinRise/onPinFall and the device models. """
+    def __init__(self):
+        self._rise = {}
+        self._fall = {}
+        self.edges = 0
+
+    def on_rise(self, pin, fn, *args, **kwargs):
+        self._rise[pin] = fn
+
+    def on_fall(self, pin, fn, *args, **kwargs):
+        self._fall[pin] = fn
+
+    def fire(self, pin, rising):
+        """ Signal an edge on `pin` (called by the device models). """
+        self.edges += 1
+        if rising:
+            fn = self._rise.get(pin)
+        else:
+            fn = self._fall.get(pin)
+        if fn is not None:
+            fn()
+
+
+class Board:
+    """ Power and user interface state of the Polaris board. """
+    def __init__(self, sim):
+        self.sim = sim
+        self.battery_backup = False
+        self.battery_voltage = 4.05
+        self.supply_5v = False
+        self.led_red = False
+        self.charger = False
+
+    # fortebit.polaris.polaris API
+    def init(self):
+        pass
+
+    def isBatteryBackup(self):
+        return self.battery_backup
+
+    def readBattVoltage(self):
+        return self.battery_voltage
+
+    def setBatteryCharger(self, on):
+        self.charger = on
+
+    def enable5V(self):
+        self.supply_5v = True
+
+    def disable5V(self):
+        self.supply_5v = False
+
+    def ledRedOn(self):
+        self.led_red = True
+
+    def ledRedOff(self):
+        self.led_red = False
+
+    def getAccessToken(self, imei, uid):
+        return "SIMULATED-TOKEN"
+
+    def GNSS(self):
+        return GNSS(self.sim)
+
+    def GSM(self):
+        return Modem(self.sim)
+
+
+# simulated start of the ride: 2019-06-15 09:00:00 UTC
+_T0 = (2019, 6, 15, 9, 0, 0)
+
+def _clock_tuple(sim):
+    s = int(sim.kernel.now // 1000)
+    y, mo, d, h, mi, se = _T0
+    se += s % 60
+    mi += (s // 60) % 60 + se // 60
+    h += s // 3600 + mi // 60
+    return (y, mo, d + h // 24, h % 24, mi % 60, se % 60)
+
+
+class GNSS:
+    """ GNSS receiver following a straight track at 5 m/s. """
+    def __init__(self, sim):
+        self.sim = sim
+        self.rate = 1000
+        self.running = True
+
+    def set_rate(self, rate):
+        self.rate = rate
+
+    def has_fix(self):
+        return True
+
+    def fix(self):
+        t = self.sim.kernel.now / 1000.0
+        lat = 45.0 + 5.0 * t / 111320.0
+        lon = 9.0 + 0.0001 * math.sin(t / 60.0)
+        return (lat, lon, 120.0, 18.0, 0.0, 9, 0.9, 1.2, 1.5, _clock_tuple(self.sim))
+
+    def is_running(self):
+        return self.running
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+class Modem:
+    """ Cellular modem: AT commands take `at_time` ms of virtual time. """
+    at_time = 30
+
+    def __init__(self, sim):
+        self.sim = sim
+
+    def rtc(self):
+        self.sim.kernel.sleep(self.at_time)
+        return _clock_tuple(self.sim)
+
+
+class GsmModule:
+    """ The ``wireless.gsm`` module. """
+    def __init__(self, sim):
+        self.sim = sim
+        self.rssi_dbm = -75
+
+    def mobile_info(self):
+        return ("350000000000000", "8939000000000000000")
+
+    def attach(self, apn, *args, **kwargs):
+        self.sim.kernel.sleep(2000)
+
+    def network_info(self):
+        self.sim.kernel.sleep(Modem.at_time)
+        return ("LTE", 222, 10, "", "1A2B", "00C0FFEE", True, True)
+
+    def link_info(self):
+        return ("10.0.0.2", "8.8.8.8")
+
+    def rssi(self):
+        self.sim.kernel.sleep(Modem.at_time)
+        return self.rssi_dbm
+
+
+class MqttClient:
+    """
+    Local stand-in for ``mqtt_client.MqttClient``: every publish takes a
+    fixed latency plus the payload transfer time, and is recorded in
+    `messages` as (virtual time, topic, payload).
+    """
+    sim = None
+    latency = 250  # ms per message
+    throughput = 4.0  # bytes per ms
+
+    def __init__(self, *args, **kwargs):
+        self.connected = False
+
+    def connect(self, *args, **kwargs):
+        self.sim.kernel.sleep(1000)
+        self.connected = True
+
+    def publish(self, topic, payload, qos=1):
+        if self.sim.link_down:
+            raise IOError("link down")
+        self.sim.kernel.sleep(self.latency + len(payload) / self.throughput)
+        self.sim.messages.append((self.sim.kernel.now, topic, payload))
+        return len(self.sim.messages)
+
+
+class Device:
+    """ The ``fortebit.iot.iot.Device`` class. """
+    def __init__(self, token, client_class, *args, **kwargs):
+        self.token = token
+        self.client = client_class()
+
+    def connect(self):
+        self.client.connect()
+
+    def publish_telemetry(self, payload):
+        return self.client.publish("v1/devices/me/telemetry", payload)
+
+
+class Reset(BaseException):
+    """
+    Raised by mcu.reset() to end the simulated program (not an Exception,
+    so the application's handlers do not swallow it).
+    """
+    pass
+
+def reset():
+    raise Reset("mcu.reset()")
+
+def uid():
+    return b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb"
+
+def new_exception(name, parent, msg=""):
+    return parent(msg)
@@ -32,6 +32,8 @@ _OUT_Y_L = 0x2a
 _OUT_Y_H = 0x2b
 _OUT_Z_L = 0x2c
 _OUT_Z_H = 0x2d
+_FIFO_CTRL = 0x2e
+_FIFO_SRC = 0x2f
 
 # CTRL1
 _ODR_MASK = 0b01110000
@@ -53,13 +55,57 @@ _SO_2G = 0.061 # 0.061 mg / digit
 _SO_4G = 0.122 # 0.122 mg / digit
 _SO_8G = 0.244 # 0.244 mg / digit
 
+# CTRL3
+_FIFO_EN = 0b10000000
+_STOP_FTH = 0b01000000
+_INT1_OVR = 0b00000100
+_INT1_FTH = 0b00000010
+_INT1_DRDY = 0b00000001
+
+# FIFO_CTRL
+_FMODE_SHIFT = 5
+_FTH_MASK = 0b00011111
+FIFO_BYPASS = 0b000
+FIFO_FIFO = 0b001
+FIFO_STREAM = 0b010
+FIFO_STREAM_TO_FIFO = 0b011
+FIFO_BYPASS_TO_STREAM = 0b100
+FIFO_BYPASS_TO_FIFO = 0b111
+FIFO_DEPTH = 32
+
+# FIFO_SRC: FTH | OVR | EMPTY | FSS[4:0]. FSS counts 0..31, so a full FIFO
+# (32 samples) reads FSS = 0 with EMPTY clear and OVR set
+_FIFO_FTH = 0b10000000
+_FIFO_OVR = 0b01000000
+_FIFO_EMPTY = 0b00100000
+_FIFO_FSS_MASK = 0b00011111
+
 SF_G = 0.001 # 1 mg = 0.001 g
 SF_SI = 0.00980665 # 1 mg = 0.00980665 m/s2
 
+# OUT_X_L..OUT_Z_H burst read (relies on IF_ADD_INC set in CTRL4)
+_XYZ_CMD = bytes([_OUT_X_L | 0x80])
+_XYZ_FMT = "<hhh"
+_XYZ_LEN = 6
+
+def _fifo_count(src):
+    # number of stored samples from a FIFO_SRC value
+    if src & _FIFO_EMPTY:
+        return 0
+    n = src & _FIFO_FSS_MASK
+    if n == 0:
+        # not empty and FSS wrapped: the FIFO is full
+        return FIFO_DEPTH
+    return n
+
 class LIS2HH12(spi.Spi):
     """Class which provides interface to LIS2HH12 3-axis accelerometer."""
     def __init__(self, drvname, pin_cs, clock=5000000, odr=ODR_100HZ, fs=FS_2G, sf=SF_SI):
         spi.Spi.__init__(self,pin_cs,drvname,clock)
+        # number of chip-select cycles issued on the bus
+        self.transactions = 0
+        # FIFO overruns detected by read_fifo() (samples were lost)
+        self.fifo_overruns = 0
 
         #print(self.whoami())
         if 0x41 != self.whoami():
@@ -75,13 +121,21 @@ class LIS2HH12(spi.Spi):
         self._odr(odr)
         self._fs(fs)
 
-    def acceleration(self):
+    def acceleration(self, burst=True):
         """
         Acceleration measured by the sensor. By default will return a
         3-tuple of X, Y, Z axis acceleration values in m/s^2. Will
         return values in g if constructor was provided `sf=SF_G`
         parameter.
+
+        All three axes are fetched in a single bus transaction, unless
+        `burst=False` is given (one transaction per axis).
         """
+        if burst:
+            k = self._so * self._sf
+            raw = self.acceleration_raw()
+            return (raw[0] * k, raw[1] * k, raw[2] * k)
+
         so = self._so
         sf = self._sf
 
@@ -90,6 +144,86 @@ class LIS2HH12(spi.Spi):
         z = self._register_word(_OUT_Z_L) * so * sf
         return (x, y, z)
 
+    def acceleration_raw(self):
+        """
+        Raw X, Y, Z output counts as a 3-tuple of signed integers, read
+        with one auto-increment transaction over OUT_X_L..OUT_Z_H.
+        Multiply by `scale()` to get the values returned by `acceleration()`.
+        """
+        self.select()
+        self.write(_XYZ_CMD)
+        data = self.read(_XYZ_LEN)
+        self.unselect()
+        self.transactions += 1
+        return struct.unpack(_XYZ_FMT, data)
+
+    def scale(self):
+        """ Conversion factor from raw counts to the configured unit. """
+        return self._so * self._sf
+
+    def fifo(self, mode=FIFO_STREAM, watermark=16):
+        """
+        Configure the hardware FIFO (32 samples deep). `mode` is one of the
+        `FIFO_*` constants, `watermark` the level (1..31) that raises the
+        FIFO threshold flag. `FIFO_BYPASS` disables the FIFO.
+        """
+        char = self._register_char(_CTRL3)
+        if mode == FIFO_BYPASS:
+            char &= ~_FIFO_EN
+        else:
+            char |= _FIFO_EN
+        self._register_char(_CTRL3, char)
+        # passing through bypass resets the FIFO content
+        self._register_char(_FIFO_CTRL, 0)
+        if mode != FIFO_BYPASS:
+            self._register_char(_FIFO_CTRL, (mode << _FMODE_SHIFT) | (watermark & _FTH_MASK))
+
+    def int1(self, drdy=False, fth=False, ovr=False):
+        """
+        Route the data-ready (`drdy`), FIFO threshold (`fth`) and FIFO
+        overrun (`ovr`) signals to the INT1 pin (active high).
+        """
+        char = self._register_char(_CTRL3)
+        char &= ~(_INT1_DRDY | _INT1_FTH | _INT1_OVR)
+        if drdy:
+            char |= _INT1_DRDY
+        if fth:
+            char |= _INT1_FTH
+        if ovr:
+            char |= _INT1_OVR
+        self._register_char(_CTRL3, char)
+
+    def fifo_level(self):
+        """
+        Number of unread samples stored in the FIFO (0..32).
+        """
+        return _fifo_count(self._register_char(_FIFO_SRC))
+
+    def read_fifo(self, buf):
+        """
+        Drain the FIFO with a single burst read. Raw X, Y, Z counts of each
+        sample are stored consecutively in `buf` (a list of at least three
+        items), as many samples as fit. Returns the number of samples read.
+        """
+        src = self._register_char(_FIFO_SRC)
+        if src & _FIFO_OVR:
+            self.fifo_overruns += 1
+        n = _fifo_count(src)
+        if n > len(buf) // 3:
+            n = len(buf) // 3
+        if n == 0:
+            return 0
+        # the address rolls back from OUT_Z_H to OUT_X_L while the FIFO is enabled
+        self.select()
+        self.write(_XYZ_CMD)
+        data = self.read(_XYZ_LEN * n)
+        self.unselect()
+        self.transactions += 1
+        values = struct.unpack("<%dh" % (3 * n), data)
+        for i in range(3 * n):
+            buf[i] = values[i]
+        return n
+
     def temperature(self):
         """
         """
@@ -106,6 +240,7 @@ class LIS2HH12(spi.Spi):
         self.write(data)
         data = self.read(struct.calcsize(fmt))
         self.unselect()
+        self.transactions += 1
         return struct.unpack(fmt, data)
 
     def _reg_write(self, register, fmt, *values):
@@ -113,6 +248,7 @@ class LIS2HH12(spi.Spi):
         data = struct.pack("<B"+fmt, register, *values)
         self.write(data)
         self.unselect()
+        self.transactions += 1
 
     def _register_word(self, register, value=None):
         if value is None:
@@ -121,8 +257,8 @@ class LIS2HH12(spi.Spi):
 
     def _register_char(self, register, value=None):
         if value is None:
-            return self._reg_read(register, "b")[0]
-        return self._reg_write(register, "b", value)
+            return self._reg_read(register, "B")[0]
+        return self._reg_write(register, "B", value)
 
     def _fs(self, value):
         char = self._register_char(_CTRL4)
@@ -0,0 +1,187 @@
+# Store-and-forward queue for telemetry records.
+#
+# Records are kept until the cloud accepts them, so readings taken while the
+# link is down are delivered after reconnecting. Several records are packed
+# in one payload (by default a JSON array of {"ts":...,"values":...} objects)
+# to save the per-message overhead of the modem.
+
+import codec
+
+class Queue:
+    """
+    Bounded FIFO of serialized telemetry records. When full, the oldest
+    record is dropped to make room. `pack` turns a list of records into one
+    payload (see codec.pack_json and codec.pack_binary).
+
+    A flush publishes at most `max_batches` payloads of up to `batch`
+    records each, so a backlog is drained at a controlled rate. Records are
+    held back until at least `min_batch` are queued, or the oldest one has
+    waited `max_wait` ms.
+    """
+    def __init__(self, size=64, batch=5, min_batch=1, max_wait=0, max_batches=2, pack=codec.pack_json):
+        self.size = size
+        self.batch = batch
+        self.min_batch = min_batch
+        self.max_wait = max_wait
+        self.max_batches = max_batches
+        self.pack = pack
+        self._items = [None] * size
+        self._stamps = [0] * size
+        self._head = 0
+        self._count = 0
+        self.dropped = 0
+        self.sent = 0
+        self.payloads = 0
+        self.failures = 0
+
+    def put(self, record, now):
+        """ Append a record, queued at time `now` (ms). """
+        if self._count == self.size:
+            # drop the oldest
+            self._items[self._head] = None
+            self._head = (self._head + 1) % self.size
+            self._count -= 1
+            self.dropped += 1
+        i = (self._head + self._count) % self.size
+        self._items[i] = record
+        self._stamps[i] = now
+        self._count += 1
+
+    def depth(self):
+        """ Number of records waiting to be published. """
+        return self._count
+
+    def ready(self, now):
+        """ True if the flush policy allows publishing at time `now`. """
+        if self._count == 0:
+            return False
+        if self._count >= self.min_batch:
+            return True
+        return now - self._stamps[self._head] >= self.max_wait
+
+    def _payload(self, n):
+        parts = []
+        for k in range(n):
+            parts.append(self._items[(self._head + k) % self.size])
+        return self.pack(parts)
+
+    def _discard(self, n):
+        for k in range(n):
+            self._items[(self._head + k) % self.size] = None
+        self._head = (self._head + n) % self.size
+        self._count -= n
+
+    def flush(self, publish, now):
+        """
+        Publish queued records with `publish(payload)`, following the flush
+        policy. Records are removed only once `publish` returns, so if it
+        raises they stay queued (and the exception is propagated).
+        Returns the number of records sent.
+        """
+        sent = 0
+        for b in range(self.max_batches):
+            if not self.ready(now):
+                break
+            n = self._count
+            if n > self.batch:
+                n = self.batch
+            try:
+                publish(self._payload(n))
+            except Exception as e:
+                self.failures += 1
+                raise e
+            self._discard(n)
+            self.sent += n
+            self.payloads += 1
+            sent += n
+        return sent
+
+    def stats(self):
+        """ Returns (depth, dropped, sent, payloads, failures). """
+        return (self._count, self.dropped, self.sent, self.payloads, self.failures)
+
+
+# default dead-bands: a field is sent again only when it moves at least this
+# much from the last value sent (0 or missing = any change)
+DEADBANDS = {
+    "battery": 0.01,
+    "temperature": 0.2,
+    "pitch": 1.0,
+    "roll": 1.0,
+    "latitude": 0.000045,  # about 5 m
+    "longitude": 0.000045,  # about 5 m or less, depending on latitude
+    "altitude": 2.0,
+    "speed": 0.5,
+    "COG": 5.0,
+    "HDOP": 0.2,
+    "VDOP": 0.2,
+    "PDOP": 0.2,
+    "air_temperature": 0.2,
+    "air_humidity": 0.5,
+    "air_pressure": 0.5,
+    "rssi": 2.0,
+    "vib1": 0.05,
+    "vib2": 0.05,
+    "vib3": 0.05,
+    "vib4": 0.05,
+    "vib5": 0.05,
+    "ppm_CO": 0.5,
+    "ppm_NO2": 0.02,
+    "ppm_NH3": 0.1,
+    "ppm_C3H8": 10.0,
+    "ppm_C4H10": 10.0,
+    "ppm_CH4": 10.0,
+    "ppm_H2": 0.1,
+    "ppm_C2H5OH": 0.2,
+}
+
+class DeltaFilter:
+    """
+    Change detection between building a record and queueing it: only the
+    fields that moved beyond their dead-band since they were last sent are
+    kept. All fields are sent at least every `keyframe_ms` ms, whatever
+    the publish period, so the cloud never holds stale values for long.
+    """
+    def __init__(self, deadbands=DEADBANDS, keyframe_ms=60000):
+        self.deadbands = deadbands
+        self.keyframe_ms = keyframe_ms
+        self._last = {}
+        self._key_time = None
+        self.fields_in = 0
+        self.fields_out = 0
+
+    def apply(self, values, now):
+        """
+        Returns the dict of fields to send from `values`, built at time
+        `now` (ms): all of them on a keyframe, possibly none otherwise.
+        """
+        key = self._key_time is None or now - self._key_time >= self.keyframe_ms
+        if key:
+            self._key_time = now
+        out = {}
+        for name in values:
+            v = values[name]
+            if key or self._changed(name, v):
+                out[name] = v
+                self._last[name] = v
+        self.fields_in += len(values)
+        self.fields_out += len(out)
+        return out
+
+    def _changed(self, name, v):
+        last = self._last.get(name)
+        if last is None:
+            return True
+        if type(v) == str or type(last) == str:
+            return v != last
+        d = v - last
+        if d < 0:
+            d = -d
+        band = self.deadbands.get(name)
+        if band is None or band == 0:
+            return d != 0
+        return d >= band
+
+    def force_keyframe(self):
+        """ Send all fields in the next record (e.g. after reconnecting). """
+        self._key_time = None
@@ -37,6 +37,8 @@ Example: ::
 
 """
 import i2c
+import timers
+import threading
 
 
 REG_CONV = 0
@@ -44,6 +46,9 @@ REG_CONF = 1
 REG_LOTH = 2
 REG_HITH = 3
 
+# conversions per second for each sps setting
+SPS_RATES = (128, 250, 490, 920, 1600, 2400, 3300, 3300)
+
 
 class ADS1015(i2c.I2C):
     timeout = 1000
@@ -68,12 +73,29 @@ ADS1015 class
     def __init__(self, i2cdrv, addr=0x48, clk=100000):
         i2c.I2C.__init__(self, i2cdrv, addr, clk)
         self.register = None
+        self.clk = clk
+        self.transactions = 0
+        self.bytes = 0
+        self.scan_rate = 0
+        self.scan_time = 0
+        self.scan_bus_time = 0
+        self.scan_duplicates = 0
+        self.duplicate_rate = 0
+        self.ready_timeouts = 0
+        self._mode = 1
+        self._period = 1
+        self._cque = 3
+        self._alert = None
+        self._rdy_thresholds = False
+        self._armed = None
         self.start()
 
     def _set_register(self, reg):
         reg = reg & 0x03
         if reg != self.register:
             self.write(reg, self.timeout)
+            self.transactions += 1
+            self.bytes += 1
             self.register = reg
 
     def read_register(self, reg, n):
@@ -82,6 +104,8 @@ ADS1015 class
         try:
             self._set_register(reg)
             res = self.read(n, self.timeout)
+            self.transactions += 1
+            self.bytes += n
         except Exception as e:
             ex = e
         finally:
@@ -198,6 +222,9 @@ ADS1015 class
         clat = (clat & 0x01) << 2
         cque = cque & 0x03
 
+        self._mode = mode
+        self._period = (1000 + SPS_RATES[sps >> 5] - 1) // SPS_RATES[sps >> 5]
+
         cmd = bytearray(3)
         cmd[0] = REG_CONF
         cmd[1] = os | ch | pga | mode
@@ -207,6 +234,8 @@ ADS1015 class
         self.lock()
         try:
             self.write(cmd, self.timeout)
+            self.transactions += 1
+            self.bytes += 3
             self.register = REG_CONF
         except Exception as e:
             ex = e
@@ -235,22 +264,23 @@ ADS1015 class
         else:
             tc_high = high & 0xfff
 
-        cmd_lo = bytearray(3)
-        cmd_lo[0] = REG_LOTH
-        cmd_lo[1] = (tc_low >> 4) & 0xFF
-        cmd_lo[2] = (tc_low << 4) & 0xFF
+        self._write_register(REG_LOTH, tc_low << 4)
+        self._write_register(REG_HITH, tc_high << 4)
+        self._rdy_thresholds = False
 
-        cmd_hi = bytearray(3)
-        cmd_hi[0] = REG_LOTH
-        cmd_hi[1] = (tc_high >> 4) & 0xFF
-        cmd_hi[2] = (tc_high << 4) & 0xFF
+    def _write_register(self, reg, value):
+        cmd = bytearray(3)
+        cmd[0] = reg
+        cmd[1] = (value >> 8) & 0xFF
+        cmd[2] = value & 0xFF
 
         ex = None
         self.lock()
         try:
-            self.write(cmd_lo, self.timeout)
-            self.write(cmd_hi, self.timeout)
-            self.register = REG_HITH
+            self.write(cmd, self.timeout)
+            self.transactions += 1
+            self.bytes += 3
+            self.register = reg
         except Exception as e:
             ex = e
         finally:
@@ -258,6 +288,150 @@ ADS1015 class
         if ex is not None:
             raise ex
 
+    def enable_ready(self, pin=None):
+        """
+
+    .. method:: enable_ready(pin = None)
+
+        Use the ALERT/RDY pin as a conversion-ready signal, by setting the most significant bit of
+        the high threshold register to 1 and that of the low threshold register to 0 (see the
+        datasheet). The comparator thresholds are no longer available for other purposes.
+
+        If *pin* is given (the MCU pin wired to ALERT/RDY), :meth:`wait_ready` blocks on its
+        falling edge (active low), otherwise it falls back to polling.
+
+        :meth:`scan` uses :meth:`wait_ready` to pace its reads. Afterwards ``scan_rate`` is the
+        effective sample rate and ``duplicate_rate`` the fraction of reads that found no new
+        conversion (no RDY edge before the timeout).
+
+        """
+        self._write_register(REG_HITH, 0x8000)
+        self._write_register(REG_LOTH, 0x0000)
+        self._rdy_thresholds = True
+        self._cque = 0
+        if pin is not None and self._alert is None:
+            self._alert = threading.Event()
+            onPinFall(pin, self._alert.set)
+
+    def wait_ready(self, timeout=None):
+        """
+
+    .. method:: wait_ready(timeout = None)
+
+        Wait for the next conversion to complete, up to *timeout* milliseconds (default: four
+        conversion periods). Returns ``True`` when a new conversion is available, ``False`` on
+        timeout (also counted in ``ready_timeouts``).
+
+        Without a ready pin, in single-shot mode the OS bit of the configuration register is
+        polled, while in continuous mode the driver just waits one conversion period.
+
+        """
+        if timeout is None:
+            timeout = 4 * self._period
+        if self._alert is not None:
+            self._alert.wait(timeout)
+            if not self._alert.is_set():
+                self.ready_timeouts += 1
+                return False
+            self._alert.clear()
+            return True
+        if self._mode == 0:
+            sleep(self._period)
+            return True
+        start = timers.now()
+        while not (self.read_register(REG_CONF, 2)[0] & 0x80):
+            if timers.now() - start >= timeout:
+                self.ready_timeouts += 1
+                return False
+            sleep(1)
+        return True
+
+    def _wait_conversions(self, since, n, rate):
+        # continuous mode without ready pin: wait until n conversions at rate SPS completed
+        # since the time since (ms). The millisecond timer may miss up to one ms of the
+        # elapsed time, so the time slept here counts as well
+        slept = 0
+        while True:
+            elapsed = timers.now() - since - 1
+            if elapsed < slept:
+                elapsed = slept
+            if elapsed * rate >= n * 1000:
+                return
+            sleep(1)
+            slept += 1
+
+    def arm(self, ch, low, high, pga=2, sps=0, window=1, latch=1, queue=0):
+        """
+
+    .. method:: arm(ch, low, high, pga = 2, sps = 0, window = 1, latch = 1, queue = 0)
+
+        Start continuous conversions on channel *ch* with the comparator enabled, so that the
+        ALERT/RDY pin is asserted when the input leaves the *low*..*high* band (12-bit raw
+        values, same scale as :meth:`get_raw_data`).
+
+        * **window** : ``1`` asserts above *high* or below *low*, ``0`` only above *high* (with
+          hysteresis down to *low*).
+        * **latch** : ``1`` keeps the pin asserted until the conversion register is read.
+        * **queue** : same as *cque* in :meth:`set`, number of out-of-band conversions required.
+
+        The slowest data rate (*sps* = 0) is the default, as it keeps the device mostly idle.
+        Use :meth:`wait_alert` to sleep until the comparator trips and :meth:`disarm` to stop.
+
+        """
+        self.set_threshold(low, high)
+        self.set(ch=ch, pga=pga, mode=0, sps=sps, cmode=window, clat=latch, cque=queue)
+        # the conversion register holds the previous channel until the new one converts
+        self._armed = (low, high, window, timers.now(), SPS_RATES[sps & 0x07])
+        if self._alert is not None:
+            self._alert.clear()
+
+    def disarm(self):
+        """
+
+    .. method:: disarm()
+
+        Stop the comparator armed by :meth:`arm` and put the device in power-down state.
+
+        """
+        self._armed = None
+        self.set(mode=1)
+
+    def wait_alert(self, timeout, poll=1000):
+        """
+
+    .. method:: wait_alert(timeout, poll = 1000)
+
+        Sleep until the comparator armed by :meth:`arm` trips, up to *timeout* milliseconds.
+        Returns the conversion value that tripped it (reading it clears a latched alert), or
+        ``None`` on timeout.
+
+        With the ALERT/RDY pin wired (see :meth:`enable_ready`) no bus traffic occurs while
+        waiting. Otherwise the conversion register is polled every *poll* milliseconds,
+        starting once the first conversion after arming is discarded (the register still
+        holds the previous channel until then).
+
+        """
+        if self._alert is not None:
+            self._alert.wait(timeout)
+            if not self._alert.is_set():
+                return None
+            self._alert.clear()
+            return self.get_raw_data()
+        low, high, window, since, rate = self._armed
+        start = timers.now()
+        self._wait_conversions(since, 2, rate)
+        while True:
+            v = self.get_raw_data()
+            if v > high or (window and v < low):
+                return v
+            left = timeout - (timers.now() - start)
+            if left <= 0:
+                return None
+            if left < poll:
+                sleep(left)
+            else:
+                sleep(poll)
+
     def get_raw_data(self):
         """
 
@@ -272,3 +446,72 @@ ADS1015 class
         v = ((r[0] << 8) | r[1]) >> 4
 
         return -(v & 0x800) + (v & 0x7FF)
+
+    def scan(self, channels, samples=64, settle=1, pga=2, sps=4):
+        """
+
+    .. method:: scan(channels, samples = 64, settle = 1, pga = 2, sps = 4)
+
+        Sample each channel of the *channels* sequence in continuous-conversion mode and
+        return a tuple with the average raw value of each channel (same order and scale as
+        :meth:`get_raw_data`).
+
+        After switching the multiplexer, *settle* conversions are skipped, then *samples*
+        conversions are read, paced to the data rate selected by *sps*, so that every read
+        returns a new conversion: with a ready pin each read waits for its RDY pulse, without
+        it until the time elapsed since the previous read (or the multiplexer switch) covers
+        a full conversion. At the end the device is put back in power-down state.
+
+        The attributes ``scan_rate`` (conversions read per second), ``scan_time`` (duration of
+        the scan in milliseconds), ``scan_bus_time`` (estimated I2C bus time in
+        microseconds), ``scan_duplicates`` and ``duplicate_rate`` (reads that found no new
+        conversion, i.e. :meth:`wait_ready` timed out) describe the last scan. Without a ready
+        pin every read is timed after a full conversion, so no duplicates are counted.
+
+        """
+        start = timers.now()
+        start_bytes = self.bytes
+        start_transactions = self.transactions
+        dups = 0
+        res = []
+        if self._cque != 3 and not self._rdy_thresholds:
+            # thresholds were used by the comparator, restore ready signalling
+            self.enable_ready()
+        rate = SPS_RATES[sps & 0x07]
+        for ch in channels:
+            self.set(ch=ch, pga=pga, mode=0, sps=sps, cque=self._cque)
+            since = timers.now()
+            n = settle + 1
+            if self._alert is not None:
+                self._alert.clear()
+                for i in range(settle):
+                    self.wait_ready()
+            sum = 0
+            for i in range(samples):
+                # wait for a new conversion
+                if self._alert is not None:
+                    if not self.wait_ready():
+                        # no RDY edge: this read returns the previous conversion again
+                        dups += 1
+                else:
+                    self._wait_conversions(since, n, rate)
+                r = self.read_register(REG_CONV, 2)
+                since = timers.now()
+                n = 1
+                v = ((r[0] << 8) | r[1]) >> 4
+                v = -(v & 0x800) + (v & 0x7FF)
+                sum += v
+            res.append(sum / samples)
+        self.set(pga=pga, mode=1, sps=sps)  # power-down
+        elapsed = timers.now() - start
+        self.scan_time = elapsed
+        if elapsed > 0:
+            self.scan_rate = len(channels) * samples * 1000 / elapsed
+        self.scan_duplicates = dups
+        if samples > 0:
+            self.duplicate_rate = dups / (len(channels) * samples)
+        # 9 clocks per byte, plus address byte, start and stop for each transaction
+        n = self.transactions - start_transactions
+        bits = 9 * (self.bytes - start_bytes + n) + 2 * n
+        self.scan_bus_time = bits * 1000000 // self.clk
+        return tuple(res)
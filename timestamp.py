@@ -38,11 +38,65 @@ def _days_before_month(year, month):
 
 def _ymd2ord(year, month, day):
     """year, month, day -> ordinal, considering 01-Jan-0001 as day 1."""
-    dim = _days_in_month(year, month)
     return (_days_before_year(year) + _days_before_month(year, month) + day)
 
+_DI400Y = _days_before_year(401)    # number of days in 400 years
+_DI100Y = _days_before_year(101)    #    "    "   "   " 100   "
+_DI4Y   = _days_before_year(5)      #    "    "   "   "   4   "
+
+def _ord2ymd(n):
+    """ordinal -> (year, month, day), considering 01-Jan-0001 as day 1."""
+    # n is a 1-based index, starting at 1-Jan-1; the 400-year, 100-year and
+    # 4-year cycles are peeled off in turn, then the month is estimated
+    # from the day of the year and corrected by at most one.
+    n -= 1
+    n400 = n // _DI400Y
+    n = n % _DI400Y
+    year = n400 * 400 + 1
+    n100 = n // _DI100Y
+    n = n % _DI100Y
+    n4 = n // _DI4Y
+    n = n % _DI4Y
+    n1 = n // 365
+    n = n % 365
+    year += n100 * 100 + n4 * 4 + n1
+    if n1 == 4 or n100 == 4:
+        # last day of a leap year at the end of a 4 or 400-year cycle
+        return (year-1, 12, 31)
+    leapyear = n1 == 3 and (n4 != 24 or n100 == 3)
+    month = (n + 50) >> 5
+    preceding = _DAYS_BEFORE_MONTH[month] + (month > 2 and leapyear)
+    if preceding > n:
+        month -= 1
+        preceding -= _DAYS_IN_MONTH[month] + (month == 2 and leapyear)
+    n -= preceding
+    return (year, month, n+1)
+
 _EPOCH_START = _ymd2ord(1970,1,1)
 
+# (year, month, day, days since the epoch) of the last date converted: the
+# date changes once a day, so in steady state only the time is computed
+_day = (1970, 1, 1, 0)
+
 def to_unix(ts):
     """Converts a date/time tuple to Unix timestamp in seconds"""
-    return (((_ymd2ord(ts[0],ts[1],ts[2])-_EPOCH_START)*24+ts[3])*60+ts[4])*60+ts[5]
+    global _day
+    c = _day
+    if ts[2] != c[2] or ts[1] != c[1] or ts[0] != c[0]:
+        c = (ts[0], ts[1], ts[2], _ymd2ord(ts[0],ts[1],ts[2])-_EPOCH_START)
+        _day = c
+    return ((c[3]*24+ts[3])*60+ts[4])*60+ts[5]
+
+def to_unix_batch(tss):
+    """Converts a list of date/time tuples to a list of Unix timestamps"""
+    res = [0] * len(tss)
+    for i in range(len(tss)):
+        res[i] = to_unix(tss[i])
+    return res
+
+def from_unix(t):
+    """Converts a Unix timestamp in seconds to a (year, month, day, hour, minute, second) tuple"""
+    days = t // 86400
+    s = t % 86400
+    ymd = _ord2ymd(days + _EPOCH_START)
+    return (ymd[0], ymd[1], ymd[2], s // 3600, (s // 60) % 60, s % 60)